@@ -1,4 +1,6 @@
 from django.contrib import admin
-from .models import GameHistory
+from .models import GameHistory, BlackjackHistory, WalletEntry
 
-admin.site.register(GameHistory)
\ No newline at end of file
+admin.site.register(GameHistory)
+admin.site.register(BlackjackHistory)
+admin.site.register(WalletEntry)
\ No newline at end of file
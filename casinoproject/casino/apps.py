@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class CasinoConfig(AppConfig):
     name = 'casino'
+
+    def ready(self):
+        from django.conf import settings
+        from .strategy import load_strategy
+        from . import checks  # noqa: F401
+
+        # ブラックジャックの判断表を読み込む（リクエストごとの計算なし）
+        load_strategy(settings.BLACKJACK_STRATEGY_FILE)
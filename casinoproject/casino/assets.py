@@ -0,0 +1,134 @@
+"""静的ファイルの配信
+
+collectstatic でファイル名に内容のハッシュを付け（CSS内のurl()も書き換える）、
+圧縮できるファイルは .gz（brotliがあれば .br も）を横に書き出しておく。
+
+本番（DEBUG=False）では serve() がそれをそのまま返す。
+- ハッシュ付きの名前は内容が変わらないので1年・immutableでキャッシュさせる
+- それ以外はETag / Last-Modifiedで再検証させる
+- Accept-Encodingに合わせて圧縮済みのファイルを選ぶ（リクエストごとに圧縮しない）
+- FileResponseで返すので、WSGIサーバーはsendfileでコピーせずに送れる
+
+マニフェスト（ハッシュ付きの名前の対応）は起動時に読み、テンプレートのカード画像のタグも
+最初に組み立てたものを使い回すので、collectstaticの後はサーバーを再起動する。
+"""
+import gzip
+import mimetypes
+import re
+from functools import lru_cache
+from pathlib import Path
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 圧縮しておく拡張子（PNG・WebPは圧縮済みなので対象外）
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.txt', '.html')
+
+# (Content-Encoding, 拡張子, 圧縮関数) 優先する順
+ENCODINGS = [('gzip', '.gz', lambda data: gzip.compress(data, 9, mtime=0))]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br', lambda data: brotli.compress(data, quality=11)))
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ファイル名にハッシュを付け、圧縮版も書き出すストレージ"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        """.gz / .br を書き出す（小さくならなければ書かない）"""
+        path = Path(self.path(name))
+        data = path.read_bytes()
+        for _, suffix, compress in ENCODINGS:
+            compressed = compress(data)
+            if len(compressed) < len(data):
+                path.with_name(path.name + suffix).write_bytes(compressed)
+
+
+@lru_cache(maxsize=None)
+def hashed_names():
+    """collectstaticで作ったハッシュ付きの名前（起動時のマニフェスト）"""
+    return frozenset(getattr(staticfiles_storage, 'hashed_files', {}).values())
+
+
+def accepted_encodings(request):
+    """Accept-Encodingに含まれる（q=0でない）エンコーディング"""
+    accepted = set()
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if re.fullmatch(r'\s*q=0(\.0*)?\s*', params):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def serve(request, path, document_root, immutable=False):
+    """document_rootの下のファイルを返す（immutable=Trueならハッシュ付きの名前を長くキャッシュ）"""
+    try:
+        fullpath = Path(safe_join(document_root, path))
+    except ValueError:
+        raise Http404
+    if not fullpath.is_file():
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(fullpath.name)
+    cache_control = IMMUTABLE if immutable and path in hashed_names() else REVALIDATE
+
+    # 圧縮済みのファイルがあればそれを返す
+    encoding = None
+    served = fullpath
+    accepted = accepted_encodings(request)
+    for name, suffix, _ in ENCODINGS:
+        candidate = fullpath.with_name(fullpath.name + suffix)
+        if name in accepted and candidate.is_file():
+            encoding, served = name, candidate
+            break
+
+    stat = served.stat()
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        not_modified = etag in parse_etags(if_none_match) or if_none_match.strip() == '*'
+    else:
+        not_modified = not was_modified_since(request.headers.get('If-Modified-Since'), stat.st_mtime)
+    if not_modified:
+        response = HttpResponseNotModified()
+    else:
+        response = FileResponse(served.open('rb'), content_type=content_type or 'application/octet-stream')
+        response.headers.pop('Content-Disposition', None)
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = cache_control
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def urlpatterns():
+    """STATIC_URL（collectstatic済みのSTATIC_ROOT）とMEDIA_URLを配信するURL"""
+    def prefix(url):
+        return r'^%s(?P<path>.*)$' % re.escape(url.lstrip('/'))
+
+    return [
+        re_path(prefix(settings.STATIC_URL), serve, {'document_root': settings.STATIC_ROOT, 'immutable': True}),
+        re_path(prefix(settings.MEDIA_URL), serve, {'document_root': settings.MEDIA_ROOT}),
+    ]
@@ -1,245 +1,182 @@
-import random
-from django.shortcuts import render, redirect
+from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views import View
-from .trump import TRUMP
+from .rendering import render
+from .shoe import load_shoe, save_shoe
+from .state_store import get_state_store, user_key
+from .engine.baccarat import BaccaratRound, BaccaratEngine
+from . import wallet
+from .metrics import timed
 from accounts.models import CustomUser
 from .models import GameHistory
+from .history import get_history_writer
+from .roadmap import Roadmap
+from .roadmap_fragment import get_roadmap_fragment, store_roadmap_fragment
 
 class Baccarat:
-    """バカラゲームのロジッククラス"""
-    
-    @staticmethod
-    def get_card_value(rank):
-        """バカラでのカードの値を取得"""
-        if rank >= 10:
-            return 0
-        return rank
+    """バカラのリクエスト処理（ゲームの進行はBaccaratEngineが担当）"""
 
-    @staticmethod
-    def calculate_score(cards):
-        """カードのスコアを計算（下一桁）"""
-        total = sum(Baccarat.get_card_value(card['rank']) for card in cards)
-        return total % 10
+    # テーブルの山札（デッキ数とカットカードの位置）
+    SHOE_STATE_KEY = 'baccarat_shoe'
+    SHOE_DECKS = 8
+    SHOE_PENETRATION = 0.8
 
-    @staticmethod
-    def should_draw_third_card(player_score, banker_score, player_third_value=None):
-        """3枚目を引くべきか判定"""
-        # 8-9はナチュラル、引かない
-        if player_score >= 8 or banker_score >= 8:
-            return False, False
-        
-        # プレイヤーの判定
-        player_draws = player_score <= 5
-        
-        # バンカーの判定
-        if not player_draws:
-            # プレイヤーが引かない場合
-            banker_draws = banker_score <= 5
-        else:
-            # プレイヤーが3枚目を引いた場合のバンカーのルール
-            if banker_score <= 2:
-                banker_draws = True
-            elif banker_score == 3:
-                banker_draws = player_third_value != 8
-            elif banker_score == 4:
-                banker_draws = player_third_value in [2, 3, 4, 5, 6, 7]
-            elif banker_score == 5:
-                banker_draws = player_third_value in [4, 5, 6, 7]
-            elif banker_score == 6:
-                banker_draws = player_third_value in [6, 7]
-            else:
-                banker_draws = False
-        
-        return player_draws, banker_draws
+    # 進行中のラウンドを保存するキー（ゲーム状態はセッションではなくストアに置く）
+    ROUND_STATE_KEY = 'baccarat_round'
+    # テーブルの罫線（山札ごと）を保存するキー
+    ROADMAP_STATE_KEY = 'baccarat_roadmap'
+
+    def load_shoe(self, request):
+        """テーブルの山札を取得"""
+        key = user_key(request.user, self.SHOE_STATE_KEY)
+        return load_shoe(get_state_store(), key, self.SHOE_DECKS, self.SHOE_PENETRATION)
+
+    def save_shoe(self, request, shoe):
+        """テーブルの山札を保存"""
+        save_shoe(get_state_store(), user_key(request.user, self.SHOE_STATE_KEY), shoe)
+
+    @classmethod
+    def save_round(cls, request, state):
+        """ラウンドの状態をストアに保存"""
+        get_state_store().set(user_key(request.user, cls.ROUND_STATE_KEY), state.dumps())
+
+    @classmethod
+    def load_round(cls, request):
+        """ストアからラウンドの状態を復元（なければNone）"""
+        data = get_state_store().get(user_key(request.user, cls.ROUND_STATE_KEY))
+        if not data:
+            return None
+        return BaccaratRound.loads(data)
+
+    @classmethod
+    def load_roadmap(cls, request):
+        """テーブルの罫線を取得（なければ空の罫線）"""
+        data = get_state_store().get(user_key(request.user, cls.ROADMAP_STATE_KEY))
+        roadmap = Roadmap.loads(data) if data else None
+        return roadmap if roadmap is not None else Roadmap()
+
+    @classmethod
+    def save_roadmap(cls, request, roadmap):
+        """テーブルの罫線を保存し、表示用のHTMLを作り直す"""
+        get_state_store().set(user_key(request.user, cls.ROADMAP_STATE_KEY), roadmap.dumps())
+        store_roadmap_fragment(request.user, roadmap)
 
     @staticmethod
-    def handle_result(player_score, banker_score, player, bet_amount, bet_type):
-        """勝敗判定とDB保存"""
-        # 勝敗判定
-        if player_score > banker_score:
-            winner = 'player'
-            player.money += bet_amount if bet_type == 'player' else -bet_amount
-        elif banker_score > player_score:
-            winner = 'banker'
-            player.money += bet_amount if bet_type == 'banker' else -bet_amount
-        else:
-            winner = 'draw'
-            if bet_type == 'draw':
-                player.money += bet_amount * 8  # 引き分けの配当
-            else:
-                player.money -= bet_amount
-        player.save()
-
-        GameHistory.objects.create(
+    def record_history(player, state):
+        """1ラウンドの履歴を保存"""
+        get_history_writer().add(
+            GameHistory,
             user=player,
-            winner=winner,
-            player_score=player_score,
-            banker_score=banker_score
+            winner=state.winner,
+            player_score=state.player_score,
+            banker_score=state.banker_score
         )
 
-        return winner
+    @classmethod
+    @timed('settle')
+    def record_table_settlement(cls, state, payouts):
+        """テーブルの1ラウンド分の (user, payout) をまとめて所持金に反映し、履歴を保存"""
+        balances = wallet.apply_many([(user.pk, payout, 'baccarat', state.round_id) for user, payout in payouts])
+        for user, _ in payouts:
+            user.money = balances.get(user.pk, user.money)
+            cls.record_history(user, state)
+
+    def finish_round(self, request, state, shoe=None):
+        """山札とラウンドを保存し、終了したラウンドの損益を反映して履歴と罫線を更新"""
+        if shoe is not None:
+            self.save_shoe(request, shoe)
+        self.save_round(request, state)
+        payout = state.pending_payout
+        if payout is None:
+            return
+        # 所持金の記録がコミットされてから精算済みにする
+        # （途中で失敗しても未精算のまま残り、やり直してもラウンドIDで二重には払わない）
+        with timed('settle'):
+            wallet.apply(request.user, payout, 'baccarat', state.round_id)
+            BaccaratEngine.settle(state)
+            self.save_round(request, state)
+            self.record_history(request.user, state)
+
+        roadmap = self.load_roadmap(request)
+        roadmap.add(state.winner)
+        self.save_roadmap(request, roadmap)
+
+    @staticmethod
+    def get_context(state, money):
+        """テンプレート用のコンテキスト"""
+        context = {
+            'player_cards': state.player_faces,
+            'banker_cards': state.banker_faces,
+            'player_score': state.player_score,
+            'banker_score': state.banker_score,
+        }
+        if state.game_over:
+            context.update({
+                'winner': state.winner,
+                'game_over': True,
+                'origin_money': money - state.payout,
+                'money': money,
+            })
+        else:
+            context['need_third_card'] = state.need_third_card
+        return context
 
     def play_game(self, request):
         """バカラゲームの実行（POSTリクエスト処理）"""
         player = request.user
         # 3枚目を引く処理
         action = request.POST.get('action')
-        if action == 'draw':
-            # セッションからカード情報を取得
-            player_cards = request.session.get('player_cards')
-            banker_cards = request.session.get('banker_cards')
-            used_cards = request.session.get('used_cards', [])
-            
-            # 3枚目を引くカードを取得
-            remaining_cards = [card for card in TRUMP if card['name'] not in used_cards]
-            new_cards = random.sample(remaining_cards, 2)
-            
-            player_draws = request.session.get('player_draws')
-            banker_draws = request.session.get('banker_draws')
-            
-            if player_draws:
-                player_cards.append(new_cards[0])
-                used_cards.append(new_cards[0]['name'])
-            
-            if banker_draws:
-                banker_cards.append(new_cards[1] if player_draws else new_cards[0])
-            
-            player_score = self.calculate_score(player_cards)
-            banker_score = self.calculate_score(banker_cards)
-
-            origin_money = player.money
-            bet_amount = request.session.get('bet_amount', 0)
-            bet_type = request.session.get('bet_type')
-            
-            winner = self.handle_result(player_score, banker_score, player, bet_amount, bet_type)
-            
-            return render(request, 'casino/bacarrat.html', {
-                'player_cards': player_cards,
-                'banker_cards': banker_cards,
-                'player_score': player_score,
-                'banker_score': banker_score,
-                'winner': winner,
-                'game_over': True,
-                'origin_money':origin_money,
-                'money': player.money,
-            })
+        state = self.load_round(request)
+        if state is None:
+            return redirect('bacara_bet')
+
+        engine = BaccaratEngine(self.load_shoe(request))
+        with timed('engine'):
+            applied = engine.apply(state, action)
+        if applied:
+            self.finish_round(request, state, engine.shoe)
+        elif state.pending_payout is not None:
+            # 前回の精算に失敗していればやり直す
+            self.finish_round(request, state)
+
+        return render(request, 'casino/bacarrat.html', self.get_context(state, player.money))
 
     def start_game(self, request):
         """バカラゲームの開始（GETリクエスト処理）"""
         player = request.user
+        previous = self.load_round(request)
+        if previous is not None and previous.pending_payout is not None:
+            # 精算に失敗したまま残っているラウンドを先に精算する
+            self.finish_round(request, previous)
+
         # 初回表示：2枚ずつ配る
-        cards = random.sample(TRUMP, 4)
-        player_cards = cards[:2]
-        banker_cards = cards[2:]
-        
-        player_score = self.calculate_score(player_cards)
-        banker_score = self.calculate_score(banker_cards)
-        
-        # 3枚目を引くか判定
-        player_draws, banker_draws = self.should_draw_third_card(player_score, banker_score)
+        engine = BaccaratEngine(self.load_shoe(request))
+        if engine.shoe.needs_shuffle or engine.shoe.position == 0:
+            # 新しい山札では罫線をやり直す
+            roadmap = self.load_roadmap(request)
+            roadmap.reset()
+            self.save_roadmap(request, roadmap)
         bet_amount = request.session.get('bet_amount', 0)
         bet_type = request.session.get('bet_type')
-        origin_money = player.money
-        # 3枚目を引く場合はセッションに保存
-        if player_draws or banker_draws:
-            request.session['player_cards'] = player_cards
-            request.session['banker_cards'] = banker_cards
-            request.session['used_cards'] = [card['name'] for card in cards]
-            request.session['player_draws'] = player_draws
-            request.session['banker_draws'] = banker_draws
-            
-            return render(request, 'casino/bacarrat.html', {
-                'player_cards': player_cards,
-                'banker_cards': banker_cards,
-                'player_score': player_score,
-                'banker_score': banker_score,
-                'need_third_card': True,
-            })
-        else:
-            winner = self.handle_result(player_score, banker_score, player, bet_amount, bet_type)
-
-            return render(request, 'casino/bacarrat.html', {
-                'player_cards': player_cards,
-                'banker_cards': banker_cards,
-                'player_score': player_score,
-                'banker_score': banker_score,
-                'winner': winner,
-                'game_over': True,
-                'origin_money':origin_money,
-                'money': player.money,
-            })
+        with timed('engine'):
+            state = engine.deal(bet_amount, bet_type)
+
+        # 3枚目が不要な場合はそのまま精算
+        self.finish_round(request, state, engine.shoe)
+
+        return render(request, 'casino/bacarrat.html', self.get_context(state, player.money))
 
     def process_bet(self, request):
         """ベット処理（GETリクエスト処理）"""
         player = request.user
         
-        # セッションから罫線の状態を取得（なければ初期化）
-        histList = request.session.get('histList', [[]])
-        last_winner = request.session.get('last_winner', None)
-        last_processed_id = request.session.get('last_processed_id', None)
-        
-        # 最新の1件だけ取得
-        latest_history = GameHistory.objects.filter(user=player).order_by('-played_at').first()
-        
-        # 最新の履歴があり、かつ未処理の場合のみ処理
-        if latest_history and latest_history.id != last_processed_id:
-            if latest_history.winner == 'player':
-                # 直前の勝者（引き分け除く）がbankerなら新しい列へ
-                if last_winner == 'b':
-                    newLine = ["p"]
-                    histList.append(newLine)
-                else:
-                    if not histList or not histList[-1]:
-                        histList = [["p"]]
-                    else:
-                        histList[-1].append('p')
-                last_winner = 'p'
-            elif latest_history.winner == 'banker':
-                # 直前の勝者（引き分け除く）がplayerなら新しい列へ
-                if last_winner == 'p':
-                    newLine = ['b']
-                    histList.append(newLine)
-                else:
-                    if not histList or not histList[-1]:
-                        histList = [['b']]
-                    else:
-                        histList[-1].append('b')
-                last_winner = 'b'
-            else:
-                # 引き分けは現在の列に追加、last_winnerは更新しない
-                if not histList or not histList[-1]:
-                    histList = [['d']]
-                else:
-                    histList[-1].append('d')
-            
-            # 処理済みIDを更新
-            last_processed_id = latest_history.id
-        
-        # 空のリストを削除
-        if histList and not histList[0]:
-            histList = histList[1:]
-        
-        # 7列を超えたら、一番古い列（先頭）を削除
-        while len(histList) > 7:
-            histList.pop(0)
-        
-        # セッションに保存
-        request.session['histList'] = histList
-        request.session['last_winner'] = last_winner
-        request.session['last_processed_id'] = last_processed_id
-
-        max_length = max(len(column) for column in histList) if histList else 5
-        max_length = max(max_length, 5)
-        max_length_value = max_length  # 数値を保持
-        max_length = range(max_length)
+        # テーブルの罫線を取得（表示用のHTMLは罫線の更新時にキャッシュ済み）
+        roadmap = self.load_roadmap(request)
 
         return render(request, 'casino/bacara_bet.html', {
-            'money': player.money, 
-            'histList': histList, 
-            'max_length': max_length,
-            'max_length_value': max_length_value
+            'money': player.money,
+            'roadmap_html': get_roadmap_fragment(player, roadmap),
         })
 
     def save_bet(self, request):
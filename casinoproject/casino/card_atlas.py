@@ -0,0 +1,97 @@
+"""カード画像のスプライト（1枚の画像に52枚と裏面を並べたもの）
+
+manage.py build_card_atlas で media/image のカード画像から
+cards.png / cards.webp とカード番号ごとの位置（cards.css / cards.json）を作る。
+作成済みなら custom_filters の card_img はスプライトを表示するので、
+1画面で何枚カードがあっても画像のダウンロードは1回になる。
+"""
+import json
+from functools import lru_cache
+from pathlib import Path
+from django.conf import settings
+from .trump import CARD_IMAGE, DECK_SIZE
+
+# 1行に並べる枚数と、裏面の位置（52枚の次）
+COLUMNS = 13
+BACK = DECK_SIZE
+CELLS = DECK_SIZE + 1
+ROWS = -(-CELLS // COLUMNS)
+
+BACK_IMAGE = 'card_back.png'
+NAME = 'cards'
+
+# スプライトの<img>に入れる透明な1ピクセル（大きさはCSSのaspect-ratioで決まる）
+BLANK_IMAGE = 'data:image/gif;base64,R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7'
+
+
+def cell_position(cell):
+    """セル番号から (列, 行)"""
+    return cell % COLUMNS, cell // COLUMNS
+
+
+def build_atlas(source_dir, output_dir, width):
+    """スプライト画像・CSS・JSONを作り、作ったファイルのパスを返す（Pillowが必要）"""
+    from PIL import Image, ImageOps
+
+    source_dir = Path(source_dir)
+    output_dir = Path(output_dir)
+    files = [*CARD_IMAGE, BACK_IMAGE]
+
+    with Image.open(source_dir / CARD_IMAGE[0]) as first:
+        height = round(first.height * width / first.width)
+    atlas = Image.new('RGBA', (width * COLUMNS, height * ROWS), (0, 0, 0, 0))
+    for cell, name in enumerate(files):
+        with Image.open(source_dir / name) as image:
+            # 裏面は縦横比が違うので、中央を切り出す
+            image = ImageOps.fit(image.convert('RGBA'), (width, height), Image.LANCZOS)
+        column, row = cell_position(cell)
+        atlas.paste(image, (column * width, row * height))
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    png = output_dir / f'{NAME}.png'
+    webp = output_dir / f'{NAME}.webp'
+    atlas.save(png, optimize=True)
+    atlas.save(webp, quality=85, method=6)
+
+    css = output_dir / f'{NAME}.css'
+    css.write_text(render_css(width, height), encoding='utf-8')
+    manifest = output_dir / f'{NAME}.json'
+    manifest.write_text(json.dumps({
+        'width': width,
+        'height': height,
+        'columns': COLUMNS,
+        'rows': ROWS,
+        'cells': [[column * width, row * height] for column, row in map(cell_position, range(CELLS))],
+    }), encoding='utf-8')
+    return [png, webp, css, manifest]
+
+
+def render_css(width, height):
+    """セルごとのbackground-positionのCSS（表示の大きさに合わせて伸縮するよう%で指定）"""
+    lines = [
+        '/* manage.py build_card_atlas で生成 */',
+        '.card-sprite {',
+        f'    background-image: url("{NAME}.png");',
+        f'    background-image: image-set(url("{NAME}.webp") type("image/webp"), url("{NAME}.png") type("image/png"));',
+        f'    background-size: {COLUMNS * 100}% {ROWS * 100}%;',
+        '    background-repeat: no-repeat;',
+        f'    aspect-ratio: {width} / {height};',
+        '}',
+    ]
+    for cell in range(CELLS):
+        column, row = cell_position(cell)
+        x = column * 100 / (COLUMNS - 1)
+        y = row * 100 / (ROWS - 1)
+        selector = 'back' if cell == BACK else f'c-{cell}'
+        lines.append(f'.card-sprite.{selector} {{ background-position: {x:g}% {y:g}%; }}')
+    return '\n'.join(lines) + '\n'
+
+
+@lru_cache(maxsize=None)
+def load_atlas():
+    """作成済みのスプライトの情報（なければNone）"""
+    path = Path(settings.CARD_ATLAS_DIR) / f'{NAME}.json'
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return None
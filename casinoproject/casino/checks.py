@@ -0,0 +1,19 @@
+"""casinoアプリのシステムチェック（manage.py check --deploy）"""
+from django.conf import settings
+from django.core.checks import Warning, register
+
+
+@register(deploy=True)
+def check_state_store(app_configs, **kwargs):
+    """ゲーム状態をプロセス内のストアに置いていないか"""
+    if getattr(settings, 'GAME_STATE_STORE', {}).get('BACKEND', 'local') != 'local':
+        return []
+    return [Warning(
+        "GAME_STATE_STORE uses the in-process 'local' backend.",
+        hint=(
+            'Each worker process keeps its own rounds and shoes, so with more than one worker '
+            "a request handled by another worker loses the round. Use the 'redis' backend "
+            'unless the server runs a single process.'
+        ),
+        id='casino.W001',
+    )]
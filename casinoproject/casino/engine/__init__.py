@@ -0,0 +1,2 @@
+from .blackjack import Hand, SplitHand, BlackjackRound, BlackjackEngine
+from .baccarat import BaccaratRound, BaccaratEngine
@@ -0,0 +1,214 @@
+"""バカラのゲームエンジン（リクエスト・セッション・DBに依存しない）
+
+deal() で最初の4枚を配り、3枚目が必要なら apply('draw') で引く。
+ラウンド終了後に settle() でプレイヤーの損益を1度だけ受け取る。
+"""
+import base64
+import secrets
+import struct
+from ..trump import TRUMP, CARD_VALUE
+
+# ラウンド状態の保存形式
+# version, flags, bet_type, bet, round_id の後にプレイヤー・バンカーの手札（枚数 + カード番号）が続く
+_ROUND_VERSION = 2
+_ROUND_HEADER = struct.Struct('>BBBqq')
+_ROUND_FLAGS = ('player_draws', 'banker_draws', 'game_over', 'settled')
+_BET_TYPES = (None, 'player', 'banker', 'draw')
+
+# カード番号からバカラでの点数（10/J/Q/Kは0）
+BACCARAT_VALUE = bytes(value % 10 for value in CARD_VALUE)
+
+
+class BaccaratRound:
+    """1ラウンド分のゲーム状態"""
+
+    __slots__ = (
+        'player_cards', 'banker_cards', 'bet', 'bet_type',
+        'player_draws', 'banker_draws', 'game_over', 'winner', 'payout', 'settled', 'round_id',
+    )
+
+    def __init__(self, player_cards, banker_cards, bet, bet_type, round_id=None):
+        # 精算の記録（WalletEntry）でラウンドを見分けるID
+        self.round_id = secrets.randbits(63) if round_id is None else round_id
+        self.player_cards = player_cards
+        self.banker_cards = banker_cards
+        self.bet = bet
+        self.bet_type = bet_type
+        self.player_draws = False
+        self.banker_draws = False
+        self.game_over = False
+        self.winner = None
+        self.payout = 0
+        self.settled = False
+
+    @property
+    def pending_payout(self):
+        """まだ精算していない損益（精算済み・未終了ならNone）"""
+        if not self.game_over or self.settled:
+            return None
+        return self.payout
+
+    def dumps(self):
+        """セッション保存用の文字列に変換"""
+        flags = 0
+        for bit, name in enumerate(_ROUND_FLAGS):
+            if getattr(self, name):
+                flags |= 1 << bit
+        bet_type = _BET_TYPES.index(self.bet_type) if self.bet_type in _BET_TYPES else 0
+        data = bytearray(_ROUND_HEADER.pack(_ROUND_VERSION, flags, bet_type, self.bet, self.round_id))
+        for cards in (self.player_cards, self.banker_cards):
+            data.append(len(cards))
+            data += bytes(cards)
+        return base64.b64encode(data).decode('ascii')
+
+    @classmethod
+    def loads(cls, data):
+        """dumps()の文字列から復元（形式が違えばNone）"""
+        raw = base64.b64decode(data)
+        if not raw or raw[0] != _ROUND_VERSION:
+            return None
+        version, flags, bet_type, bet, round_id = _ROUND_HEADER.unpack_from(raw)
+        offset = _ROUND_HEADER.size
+        hands = []
+        for _ in range(2):
+            count = raw[offset]
+            offset += 1
+            hands.append(list(raw[offset:offset + count]))
+            offset += count
+        state = cls(hands[0], hands[1], bet, _BET_TYPES[bet_type], round_id)
+        for bit, name in enumerate(_ROUND_FLAGS):
+            setattr(state, name, bool(flags >> bit & 1))
+        if state.game_over:
+            # 勝敗と損益はカードから決まる
+            BaccaratEngine.finish_round(state)
+        return state
+
+    @property
+    def player_score(self):
+        return BaccaratEngine.calculate_score(self.player_cards)
+
+    @property
+    def banker_score(self):
+        return BaccaratEngine.calculate_score(self.banker_cards)
+
+    @property
+    def need_third_card(self):
+        """3枚目を引く操作が必要か"""
+        return not self.game_over and (self.player_draws or self.banker_draws)
+
+    @property
+    def player_faces(self):
+        return [TRUMP[card] for card in self.player_cards]
+
+    @property
+    def banker_faces(self):
+        return [TRUMP[card] for card in self.banker_cards]
+
+
+class BaccaratEngine:
+    """バカラのルール"""
+
+    WINNERS = ('player', 'banker', 'draw')
+    BET_TYPES = ('player', 'banker', 'draw')
+
+    # 引き分けへのベットの配当
+    DRAW_PAYOUT = 8
+
+    def __init__(self, shoe, rng=None):
+        self.shoe = shoe
+        self.rng = rng
+
+    @staticmethod
+    def calculate_score(cards):
+        """カード番号のリストからスコアを計算（下一桁）"""
+        return sum(BACCARAT_VALUE[card] for card in cards) % 10
+
+    @staticmethod
+    def should_draw_third_card(player_score, banker_score, player_third_value=None):
+        """3枚目を引くべきか判定"""
+        # 8-9はナチュラル、引かない
+        if player_score >= 8 or banker_score >= 8:
+            return False, False
+
+        # プレイヤーの判定
+        player_draws = player_score <= 5
+
+        # バンカーの判定
+        if not player_draws:
+            # プレイヤーが引かない場合
+            banker_draws = banker_score <= 5
+        else:
+            # プレイヤーが3枚目を引いた場合のバンカーのルール
+            if banker_score <= 2:
+                banker_draws = True
+            elif banker_score == 3:
+                banker_draws = player_third_value != 8
+            elif banker_score == 4:
+                banker_draws = player_third_value in [2, 3, 4, 5, 6, 7]
+            elif banker_score == 5:
+                banker_draws = player_third_value in [4, 5, 6, 7]
+            elif banker_score == 6:
+                banker_draws = player_third_value in [6, 7]
+            else:
+                banker_draws = False
+
+        return player_draws, banker_draws
+
+    @staticmethod
+    def judge_winner(player_score, banker_score):
+        """勝敗判定"""
+        if player_score > banker_score:
+            return 'player'
+        if banker_score > player_score:
+            return 'banker'
+        return 'draw'
+
+    @classmethod
+    def calculate_payout(cls, winner, bet_type, bet_amount):
+        """ベットの損益を計算"""
+        if winner == 'draw' and bet_type == 'draw':
+            return bet_amount * cls.DRAW_PAYOUT  # 引き分けの配当
+        if winner == bet_type:
+            return bet_amount
+        return -bet_amount
+
+    def deal(self, bet, bet_type):
+        """最初の2枚ずつを配る（3枚目が不要ならそのまま決着）"""
+        # カットカードに到達していればラウンド開始前に再シャッフル
+        if self.shoe.needs_shuffle:
+            self.shoe.shuffle(self.rng)
+        cards = [self.shoe.draw() for _ in range(4)]
+        state = BaccaratRound(cards[:2], cards[2:], bet, bet_type)
+
+        # 3枚目を引くか判定
+        state.player_draws, state.banker_draws = self.should_draw_third_card(
+            state.player_score, state.banker_score)
+        if not state.need_third_card:
+            self.finish_round(state)
+        return state
+
+    def apply(self, state, action):
+        """3枚目を引く（'draw'以外・引けない状態なら無視）し、適用したかを返す"""
+        if action != 'draw' or not state.need_third_card:
+            return False
+        if state.player_draws:
+            state.player_cards.append(self.shoe.draw())
+        if state.banker_draws:
+            state.banker_cards.append(self.shoe.draw())
+        self.finish_round(state)
+        return True
+
+    @classmethod
+    def finish_round(cls, state):
+        """勝敗と損益を決める"""
+        state.winner = cls.judge_winner(state.player_score, state.banker_score)
+        state.payout = cls.calculate_payout(state.winner, state.bet_type, state.bet)
+        state.game_over = True
+
+    @staticmethod
+    def settle(state):
+        """終了したラウンドを精算済みにして損益を返す（精算済み・未終了ならNone）"""
+        payout = state.pending_payout
+        if payout is not None:
+            state.settled = True
+        return payout
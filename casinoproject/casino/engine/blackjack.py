@@ -0,0 +1,332 @@
+"""ブラックジャックのゲームエンジン（リクエスト・セッション・DBに依存しない）
+
+deal() でラウンドを開始し、apply() でアクションを適用、
+ラウンド終了後に settle() でプレイヤーの損益を1度だけ受け取る。
+"""
+import base64
+import secrets
+import struct
+from ..trump import TRUMP, CARD_RANK, CARD_VALUE
+
+# ラウンド状態の保存形式
+# version, flags, winner, bet, origin_money, payout, round_id の後に
+# プレイヤー・ディーラー・スプリットの各手札（枚数 + カード番号）が続く
+_ROUND_VERSION = 2
+_ROUND_HEADER = struct.Struct('>BBBqqqq')
+_SPLIT_HEADER = struct.Struct('>BBB')
+_ROUND_FLAGS = ('split_available', 'split_prompt', 'split_active', 'split_complete', 'game_over', 'settled')
+_WINNERS = (None, 'player', 'dealer', 'blackjack', 'draw', 'split')
+_STATUSES = ('playing', 'standing', 'bust', 'blackjack')
+
+
+class Hand:
+    """ブラックジャックの手札（カード番号のリスト + 合計点）
+
+    Aを1として数えたハードの合計と、Aを含むかのフラグを1枚ごとに更新するため、
+    スコアの取得は手札の枚数に関係なく定数時間
+    """
+
+    __slots__ = ('cards', 'hard', 'has_ace')
+
+    def __init__(self, cards=()):
+        self.cards = []
+        self.hard = 0
+        self.has_ace = False
+        for card in cards:
+            self.add(card)
+
+    def __len__(self):
+        return len(self.cards)
+
+    def add(self, card):
+        """カードを1枚追加"""
+        self.cards.append(card)
+        self.hard += CARD_VALUE[card]
+        if CARD_RANK[card] == 1:
+            self.has_ace = True
+
+    @property
+    def soft(self):
+        """Aを11として数えているか"""
+        return self.has_ace and self.hard <= 11
+
+    @property
+    def score(self):
+        """手札のスコア"""
+        return self.hard + 10 if self.soft else self.hard
+
+    @property
+    def faces(self):
+        """テンプレート用のカード情報"""
+        return [TRUMP[card] for card in self.cards]
+
+
+class SplitHand(Hand):
+    """スプリット後の手札（状態と勝敗を持つ）"""
+
+    __slots__ = ('status', 'result')
+
+    def __init__(self, cards=(), status='playing', result=None):
+        super().__init__(cards)
+        self.status = status
+        self.result = result
+
+
+class BlackjackRound:
+    """1ラウンド分のゲーム状態"""
+
+    __slots__ = (
+        'player', 'dealer', 'split_hands', 'bet', 'origin_money',
+        'split_available', 'split_prompt', 'split_active', 'split_complete',
+        'game_over', 'winner', 'payout', 'settled', 'round_id',
+    )
+
+    def __init__(self, player, dealer, bet, origin_money, round_id=None):
+        # 精算の記録（WalletEntry）でラウンドを見分けるID
+        self.round_id = secrets.randbits(63) if round_id is None else round_id
+        self.player = player
+        self.dealer = dealer
+        self.split_hands = []
+        self.bet = bet
+        self.origin_money = origin_money
+        self.split_available = False
+        self.split_prompt = False
+        self.split_active = False
+        self.split_complete = False
+        self.game_over = False
+        self.winner = None
+        self.payout = 0
+        self.settled = False
+
+    @property
+    def pending_payout(self):
+        """まだ精算していない損益（精算済み・未終了ならNone）"""
+        if not self.game_over or self.settled:
+            return None
+        return self.payout
+
+    def dumps(self):
+        """セッション保存用の文字列に変換"""
+        flags = 0
+        for bit, name in enumerate(_ROUND_FLAGS):
+            if getattr(self, name):
+                flags |= 1 << bit
+        data = bytearray(_ROUND_HEADER.pack(
+            _ROUND_VERSION, flags, _WINNERS.index(self.winner),
+            self.bet, self.origin_money, self.payout, self.round_id))
+        for hand in (self.player, self.dealer):
+            data.append(len(hand.cards))
+            data += bytes(hand.cards)
+        data.append(len(self.split_hands))
+        for hand in self.split_hands:
+            data += _SPLIT_HEADER.pack(
+                _STATUSES.index(hand.status), _WINNERS.index(hand.result), len(hand.cards))
+            data += bytes(hand.cards)
+        return base64.b64encode(data).decode('ascii')
+
+    @classmethod
+    def loads(cls, data):
+        """dumps()の文字列から復元（形式が違えばNone）"""
+        raw = base64.b64decode(data)
+        if not raw or raw[0] != _ROUND_VERSION:
+            return None
+        version, flags, winner, bet, origin_money, payout, round_id = _ROUND_HEADER.unpack_from(raw)
+        offset = _ROUND_HEADER.size
+        hands = []
+        for _ in range(2):
+            count = raw[offset]
+            offset += 1
+            hands.append(Hand(raw[offset:offset + count]))
+            offset += count
+        state = cls(hands[0], hands[1], bet, origin_money, round_id)
+        split_count = raw[offset]
+        offset += 1
+        for _ in range(split_count):
+            status, result, count = _SPLIT_HEADER.unpack_from(raw, offset)
+            offset += _SPLIT_HEADER.size
+            cards = raw[offset:offset + count]
+            offset += count
+            state.split_hands.append(SplitHand(cards, _STATUSES[status], _WINNERS[result]))
+        for bit, name in enumerate(_ROUND_FLAGS):
+            setattr(state, name, bool(flags >> bit & 1))
+        state.winner = _WINNERS[winner]
+        state.payout = payout
+        return state
+
+
+class BlackjackEngine:
+    """ブラックジャックのルール"""
+
+    SPLIT_COMPLETE_STATES = {'standing', 'bust', 'blackjack'}
+    ACTIONS = ('hit', 'stand', 'split_yes', 'split_no', 'split_hit', 'split_stand')
+
+    # ブラックジャックの配当
+    BLACKJACK_PAYOUT = 1.5
+
+    def __init__(self, shoe, rng=None):
+        self.shoe = shoe
+        self.rng = rng
+
+    def draw(self, hand):
+        """山札からカードを1枚引いて手札に追加"""
+        card = self.shoe.draw()
+        hand.add(card)
+        return card
+
+    def play_dealer(self, dealer):
+        """ディーラーは17以上になるまで引く"""
+        while dealer.score < 17:
+            self.draw(dealer)
+        return dealer.score
+
+    @staticmethod
+    def can_split(player_cards, bet_amount, player_money):
+        """スプリット可能か判定"""
+        return (
+            len(player_cards) == 2
+            and CARD_RANK[player_cards[0]] == CARD_RANK[player_cards[1]]
+            and bet_amount > 0
+            and player_money >= bet_amount * 2
+        )
+
+    @classmethod
+    def judge(cls, player_score, dealer_score, card_count, bet_amount):
+        """勝敗と損益を判定"""
+        # ブラックジャック判定（最初の2枚で21）
+        is_blackjack = card_count == 2 and player_score == 21
+
+        if player_score > 21:
+            return 'dealer', -bet_amount
+        if dealer_score > 21 or player_score > dealer_score:
+            if is_blackjack:
+                # ブラックジャックは1.5倍の配当
+                return 'blackjack', int(bet_amount * cls.BLACKJACK_PAYOUT)
+            return 'player', bet_amount
+        if dealer_score > player_score:
+            return 'dealer', -bet_amount
+        # 引き分けの場合、ベット金額は変わらない
+        return 'draw', 0
+
+    def split_round_ready(self, hands):
+        """全ハンドの入力が完了したか"""
+        if not hands:
+            return False
+        return all(hand.status in self.SPLIT_COMPLETE_STATES for hand in hands)
+
+    def deal(self, bet, money, player_cards=None):
+        """新しいラウンドを配る（player_cardsを渡すとプレイヤーの手札を固定）"""
+        # カットカードに到達していればラウンド開始前に再シャッフル
+        if self.shoe.needs_shuffle:
+            self.shoe.shuffle(self.rng)
+        if player_cards is None:
+            player = Hand()
+            dealer = Hand()
+            for hand in (player, dealer, player, dealer):
+                self.draw(hand)
+        else:
+            player = Hand(player_cards)
+            dealer = Hand()
+            for _ in range(2):
+                self.draw(dealer)
+
+        state = BlackjackRound(player, dealer, bet, money)
+        state.split_available = self.can_split(player.cards, bet, money)
+        state.split_prompt = state.split_available
+
+        # プレイヤーが最初の2枚でブラックジャック（21）の場合、即座に勝利
+        if player.score == 21:
+            self.play_dealer(dealer)
+            state.winner = 'blackjack'
+            state.payout = int(bet * self.BLACKJACK_PAYOUT)
+            state.game_over = True
+        return state
+
+    def apply(self, state, action, hand_index=None):
+        """アクションを適用（適用できないアクションは無視）し、適用したかを返す"""
+        if state.game_over:
+            return False
+
+        if action == 'split_no' and state.split_prompt:
+            state.split_prompt = False
+            state.split_available = False
+            return True
+
+        if action == 'split_yes' and state.split_available and not state.split_active:
+            for card in state.player.cards[:2]:
+                hand = SplitHand([card])
+                self.draw(hand)
+                if hand.score == 21:
+                    hand.status = 'blackjack'
+                state.split_hands.append(hand)
+            state.split_active = True
+            state.split_prompt = False
+            state.split_available = False
+            if self.split_round_ready(state.split_hands):
+                self.resolve_split_round(state)
+            return True
+
+        if state.split_active and action in ('split_hit', 'split_stand'):
+            if hand_index is None or not 0 <= hand_index < len(state.split_hands):
+                return False
+            hand = state.split_hands[hand_index]
+            if hand.status != 'playing':
+                return False
+            if action == 'split_hit':
+                self.draw(hand)
+                # Aのスプリットなら1回ヒットしたら自動でSTANDING
+                if CARD_RANK[hand.cards[0]] == 1:
+                    hand.status = 'standing'
+                elif hand.score > 21:
+                    hand.status = 'bust'
+                elif hand.score == 21:
+                    hand.status = 'standing'
+            else:
+                hand.status = 'standing'
+            if self.split_round_ready(state.split_hands) and not state.split_complete:
+                self.resolve_split_round(state)
+            return True
+
+        if action == 'hit' and not state.split_active:
+            state.split_prompt = False
+            state.split_available = False
+            self.draw(state.player)
+            if state.player.score >= 21:
+                # プレイヤーがバースト、ブラックジャック
+                self.finish_round(state)
+            return True
+
+        if action == 'stand' and not state.split_active:
+            state.split_prompt = False
+            state.split_available = False
+            self.finish_round(state)
+            return True
+
+        return False
+
+    def finish_round(self, state):
+        """ディーラーのターンを行い勝敗を決める"""
+        dealer_score = self.play_dealer(state.dealer)
+        state.winner, state.payout = self.judge(
+            state.player.score, dealer_score, len(state.player), state.bet)
+        state.game_over = True
+
+    def resolve_split_round(self, state):
+        """スプリット後の勝敗をまとめて判定"""
+        dealer_score = self.play_dealer(state.dealer)
+        state.payout = 0
+        for hand in state.split_hands:
+            hand.result, payout = self.judge(hand.score, dealer_score, len(hand), state.bet)
+            state.payout += payout
+        state.split_complete = True
+        state.split_prompt = False
+        state.split_available = False
+        state.game_over = True
+        state.winner = 'split'
+
+    @staticmethod
+    def settle(state):
+        """終了したラウンドを精算済みにして損益を返す（精算済み・未終了ならNone）"""
+        payout = state.pending_payout
+        if payout is not None:
+            state.settled = True
+        return payout
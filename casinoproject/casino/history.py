@@ -0,0 +1,209 @@
+"""ゲーム履歴（GameHistory / BlackjackHistory）の書き込みをまとめるバッファ
+
+1ハンドごとに objects.create() するのではなく、行をメモリに溜め、
+件数（BATCH_SIZE）か経過時間（FLUSH_INTERVAL）でまとめて bulk_create する。
+
+リクエストが来なくても、バックグラウンドのスレッドがFLUSH_INTERVALごとに書き込む。
+
+溜めている行はプロセスごとのスプールファイルにも1行ずつ追記しておき、
+プロセスが落ちても次に起動したプロセスがDBへ書き戻す。
+書き込み中のスプールはロックしておくので、動いている他のプロセスの分は触らない。
+スプールはFSYNC=Trueのときだけ1行ごとにfsyncする（Falseならプロセスが落ちても残るが、
+OSごと落ちるとディスクに書かれていない最後の数秒分は失われる）。
+"""
+import atexit
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from django.apps import apps
+from django.db import connection, models, transaction
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# スプールファイルの名前
+SPOOL_PREFIX = 'history-'
+SPOOL_SUFFIX = '.jsonl'
+
+
+def _lock(file):
+    """ファイルを排他ロック（取れなければFalse）"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def _serialize(model, fields):
+    """モデルのフィールドの辞書をスプールに書ける形に変換"""
+    row = {}
+    for name, value in fields.items():
+        field = model._meta.get_field(name)
+        if isinstance(value, models.Model):
+            value = value.pk
+        elif isinstance(value, (bytes, bytearray)):
+            value = base64.b64encode(value).decode('ascii')
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        row[field.attname] = value
+    return {'model': model._meta.label_lower, 'fields': row}
+
+
+def _to_model(row):
+    """スプールの1行をモデルのインスタンスに戻す"""
+    model = apps.get_model(row['model'])
+    fields = {}
+    for name, value in row['fields'].items():
+        internal_type = model._meta.get_field(name).get_internal_type()
+        if internal_type == 'BinaryField':
+            value = base64.b64decode(value)
+        elif internal_type == 'DateTimeField':
+            value = datetime.fromisoformat(value)
+        fields[name] = value
+    return model(**fields)
+
+
+def _bulk_create(rows):
+    """モデルごとにまとめて1つのトランザクションで書き込む"""
+    objects = {}
+    for row in rows:
+        obj = _to_model(row)
+        objects.setdefault(type(obj), []).append(obj)
+    with transaction.atomic():
+        for model, batch in objects.items():
+            model.objects.bulk_create(batch)
+
+
+class HistoryWriter:
+    """履歴の行をまとめて書き込む"""
+
+    def __init__(self, spool_dir=None, batch_size=100, flush_interval=5.0, fsync=False):
+        self.spool_dir = Path(spool_dir) if spool_dir else None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.rows = []
+        self.last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._spool = None
+
+    def _open_spool(self):
+        """このプロセス用のスプールファイルを開く"""
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        name = f'{SPOOL_PREFIX}{os.getpid()}'
+        suffix = 0
+        while True:
+            spool = open(self.spool_dir / f'{name}{SPOOL_SUFFIX}', 'a+', encoding='utf-8')
+            if _lock(spool):
+                return spool
+            # 同じPIDの別のプロセス（別のコンテナなど）が使っている
+            spool.close()
+            suffix += 1
+            name = f'{SPOOL_PREFIX}{os.getpid()}-{suffix}'
+
+    def add(self, model, **fields):
+        """1ハンド分の履歴を追加（しきい値を超えたら書き込む）"""
+        fields.setdefault('played_at', timezone.now())
+        row = _serialize(model, fields)
+        with self._lock:
+            if self.spool_dir is not None:
+                if self._spool is None:
+                    self._spool = self._open_spool()
+                self._spool.write(json.dumps(row) + '\n')
+                self._spool.flush()
+                if self.fsync:
+                    os.fsync(self._spool.fileno())
+            self.rows.append(row)
+            if (len(self.rows) >= self.batch_size
+                    or time.monotonic() - self.last_flush >= self.flush_interval):
+                # 呼び出し元の精算は終わっているので失敗させない
+                self._try_flush()
+
+    def flush(self):
+        """溜めている行をすべて書き込む"""
+        with self._lock:
+            self._flush()
+
+    def _try_flush(self):
+        """書き込み、失敗したらログに残す（行はバッファとスプールに残り、次の書き込みでやり直す）"""
+        try:
+            self._flush()
+        except Exception:
+            logger.exception('Failed to flush %d history rows', len(self.rows))
+
+    def start(self):
+        """FLUSH_INTERVALごとに溜まった行を書き込むスレッドを起動"""
+        threading.Thread(target=self._run, name='history-writer', daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            with self._lock:
+                if self.rows and time.monotonic() - self.last_flush >= self.flush_interval:
+                    self._try_flush()
+                    connection.close()
+
+    def _flush(self):
+        if self.rows:
+            _bulk_create(self.rows)
+            self.rows = []
+            if self._spool is not None:
+                self._spool.truncate(0)
+        self.last_flush = time.monotonic()
+
+    def replay(self):
+        """落ちたプロセスのスプールをDBへ書き戻し、書き戻した件数を返す"""
+        if self.spool_dir is None or not self.spool_dir.is_dir():
+            return 0
+        count = 0
+        for path in sorted(self.spool_dir.glob(f'{SPOOL_PREFIX}*{SPOOL_SUFFIX}')):
+            if self._spool is not None and path == Path(self._spool.name):
+                continue
+            with open(path, 'r+', encoding='utf-8') as spool:
+                if not _lock(spool):
+                    # 動いているプロセスのスプール
+                    continue
+                rows = []
+                for line in spool:
+                    if line.endswith('\n'):
+                        rows.append(json.loads(line))
+                if rows:
+                    _bulk_create(rows)
+                    count += len(rows)
+                path.unlink()
+        return count
+
+
+_writer = None
+
+
+def get_history_writer():
+    """settings.GAME_HISTORY_BUFFER の書き込みバッファ（最初の呼び出しでスプールを書き戻す）"""
+    global _writer
+    if _writer is None:
+        from django.conf import settings
+        config = getattr(settings, 'GAME_HISTORY_BUFFER', {})
+        writer = HistoryWriter(
+            spool_dir=config.get('SPOOL_DIR'),
+            batch_size=config.get('BATCH_SIZE', 100),
+            flush_interval=config.get('FLUSH_INTERVAL', 5.0),
+            fsync=config.get('FSYNC', False),
+        )
+        writer.replay()
+        writer.start()
+        atexit.register(writer.flush)
+        _writer = writer
+    return _writer
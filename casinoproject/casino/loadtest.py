@@ -0,0 +1,159 @@
+"""ゲーム画面の負荷試験
+
+ネットワークを使わず、プロセス内のWSGIアプリ（django.test.Client）に
+プレイヤーごとのスレッドからリクエストを送る。
+ブラウザと同じ順（ベット→配る→アクション→精算）にゲームを進め、
+エンドポイントごとの応答時間を集計する。
+"""
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from django.test import Client
+from django.urls import resolve, reverse
+from .engine import BaccaratEngine
+
+# 1ハンドのベット額
+BET_AMOUNT = 10
+# 1ラウンドのアクションの上限（ループしないように）
+MAX_ACTIONS = 12
+# このスコア未満ならヒット
+HIT_BELOW = 17
+
+PLAYER_SCORE = re.compile(rb'id="player-score">Score: (\d+)<')
+HAND_INDEX = re.compile(rb'name="hand_index" value="(\d)"')
+
+
+def percentile(values, q):
+    """ソート済みのリストのパーセンタイル（最近傍）"""
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+class Recorder:
+    """エンドポイントごとの応答時間とエラー数"""
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.timings[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, elapsed):
+        """エンドポイントごとの件数・1秒あたりの件数・p50/p95/p99（ミリ秒）"""
+        rows = []
+        for endpoint in sorted(self.timings):
+            timings = sorted(self.timings[endpoint])
+            rows.append({
+                'endpoint': endpoint,
+                'requests': len(timings),
+                'rps': len(timings) / elapsed,
+                'p50_ms': percentile(timings, 0.50) * 1000,
+                'p95_ms': percentile(timings, 0.95) * 1000,
+                'p99_ms': percentile(timings, 0.99) * 1000,
+                'errors': self.errors[endpoint],
+            })
+        return rows
+
+
+class Player:
+    """1人のプレイヤー（ブラウザと同じ順にリクエストを送る）"""
+
+    def __init__(self, user, recorder, seed=None):
+        self.client = Client(HTTP_HOST='localhost')
+        self.client.force_login(user)
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+
+    def request(self, method, name, data=None, expect=200, **extra):
+        """リクエストを送って応答時間を記録"""
+        path = reverse(name)
+        started = time.perf_counter()
+        response = getattr(self.client, method)(path, data, **extra)
+        elapsed = time.perf_counter() - started
+        self.recorder.record(f'{method.upper()} {resolve(path).url_name}', elapsed, response.status_code == expect)
+        return response
+
+    def play(self, game, rounds):
+        play_round = getattr(self, f'play_{game}')
+        for _ in range(rounds):
+            play_round()
+
+    def play_baccarat(self):
+        self.request('get', 'bacara_bet')
+        bet_type = self.rng.choice(BaccaratEngine.BET_TYPES)
+        self.request('post', 'bacara_bet', {'bet_amount': BET_AMOUNT, 'bet_type': bet_type}, expect=302)
+        response = self.request('get', 'bacarrat')
+        if b'value="draw"' in response.content:
+            self.request('post', 'bacarrat', {'action': 'draw'})
+
+    def play_blackjack(self):
+        self.request('get', 'blackjack_bet')
+        self.request('post', 'blackjack_bet', {'bet_amount': BET_AMOUNT}, expect=302)
+        body = self.request('get', 'blackjack').content
+        if b'value="split_yes"' in body:
+            action = self.rng.choice(['split_yes', 'split_no'])
+            body = self.request('post', 'blackjack', {'action': action}).content
+
+        # 画面から最初の状態を読み、あとはアクションAPIの差分で進める
+        if b'value="split_hit"' in body:
+            # ボタンが残っているハンドがプレイ中（スコアは読まず、最初はヒット）
+            playing = {int(index) for index in HAND_INDEX.findall(body)}
+            hands = [{'status': 'playing' if index in playing else 'done', 'score': 0} for index in range(2)]
+            delta = {'split_active': True, 'game_over': False, 'split_hands': hands}
+        elif b'value="hit"' in body:
+            delta = {'split_active': False, 'game_over': False, 'player': {'score': int(PLAYER_SCORE.search(body)[1])}}
+        else:
+            return
+
+        for _ in range(MAX_ACTIONS):
+            if delta['game_over']:
+                # ブラウザは決着したら画面を読み直す
+                self.request('get', 'blackjack')
+                return
+            if delta['split_active']:
+                index = next(i for i, hand in enumerate(delta['split_hands']) if hand['status'] == 'playing')
+                action = 'split_hit' if delta['split_hands'][index]['score'] < HIT_BELOW else 'split_stand'
+                data = {'action': action, 'hand_index': index}
+            elif delta['player']['score'] < HIT_BELOW:
+                data = {'action': 'hit'}
+            else:
+                # スタンドは通常のフォーム送信
+                self.request('post', 'blackjack', {'action': 'stand'})
+                return
+            response = self.request('post', 'blackjack_action', data, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+            if response.status_code != 200:
+                return
+            delta = response.json()
+
+
+def run(users, games, rounds, seed=None):
+    """ユーザーごとのスレッドで各ゲームをroundsラウンドずつ進め、(集計, 経過秒数) を返す"""
+    recorder = Recorder()
+    players = [Player(user, recorder, None if seed is None else seed + index) for index, user in enumerate(users)]
+    errors = []
+
+    def play(player):
+        try:
+            for game in games:
+                player.play(game, rounds)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=play, args=(player,)) for player in players]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    return recorder.report(elapsed), elapsed
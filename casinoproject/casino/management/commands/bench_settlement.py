@@ -0,0 +1,121 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from importlib import import_module
+from pathlib import Path
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from accounts.models import CustomUser
+from casino import wallet
+from casino.bacarrat import Baccarat
+from casino.engine import BaccaratEngine
+from casino.history import HistoryWriter
+from casino.models import GameHistory
+from casino.shoe import Shoe
+
+PROFILES = ('basic', 'production')
+
+
+class Command(BaseCommand):
+    help = '複数スレッドから同時に精算し、DBプロファイルごとの1秒あたりの精算数を比べる'
+
+    def add_arguments(self, parser):
+        parser.add_argument('profiles', nargs='*', default=list(PROFILES), help='比べるプロファイル（basic / production）')
+        parser.add_argument('--threads', type=int, default=8, help='同時に精算するスレッド数')
+        parser.add_argument('--hands', type=int, default=200, help='スレッドごとのハンド数')
+        parser.add_argument('--worker', action='store_true', help='（内部用）このプロセスの設定で計測する')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            result = self.run_worker(options['threads'], options['hands'])
+            self.stdout.write(json.dumps(result))
+            return
+
+        for profile in options['profiles']:
+            if profile not in PROFILES:
+                raise CommandError(f"Unknown profile: {profile}")
+
+        manage = str(Path(settings.BASE_DIR) / 'manage.py')
+        for profile in options['profiles']:
+            # プロファイルごとに新しいDBファイルで計測（db.sqlite3は触らない）
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, CASINO_DB_PROFILE=profile, CASINO_DB_NAME=str(Path(tmp) / 'bench.sqlite3'))
+                subprocess.run([sys.executable, manage, 'migrate', '--noinput', '-v', '0'], env=env, check=True)
+                worker = subprocess.run(
+                    [sys.executable, manage, 'bench_settlement', '--worker',
+                     '--threads', str(options['threads']), '--hands', str(options['hands'])],
+                    env=env, check=True, capture_output=True, text=True,
+                )
+            result = json.loads(worker.stdout.splitlines()[-1])
+            self.stdout.write(
+                f"{profile:<10} {result['hands']:>6} hands in {result['seconds']:.2f}s "
+                f"({result['hands'] / result['seconds']:,.0f} hands/s)  "
+                f"p50 {result['p50_ms']:.1f}ms  p99 {result['p99_ms']:.1f}ms  locked {result['errors']}"
+            )
+
+    def run_worker(self, threads, hands):
+        """threads個のスレッドがそれぞれのユーザーでhandsハンドずつ精算する"""
+        users = [CustomUser.objects.create_user(f'bench{index}') for index in range(threads)]
+        # スプールは使わない（サーバーのスプールを書き戻さないように）
+        writer = HistoryWriter()
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        start = threading.Barrier(threads + 1)
+        latencies = []
+        errors = []
+
+        def play(user):
+            engine = BaccaratEngine(Shoe(Baccarat.SHOE_DECKS, Baccarat.SHOE_PENETRATION))
+            session = session_store()
+            timings = []
+            failed = 0
+            start.wait()
+            try:
+                for _ in range(hands):
+                    state = engine.deal(10, 'banker')
+                    engine.apply(state, 'draw')
+                    started = time.perf_counter()
+                    try:
+                        # 1リクエスト分の書き込み（精算・履歴・セッション）
+                        wallet.apply(user, BaccaratEngine.settle(state), 'baccarat')
+                        writer.add(
+                            GameHistory,
+                            user=user,
+                            winner=state.winner,
+                            player_score=state.player_score,
+                            banker_score=state.banker_score
+                        )
+                        session['bet_amount'] = 10
+                        session.save()
+                    except OperationalError:
+                        failed += 1
+                        continue
+                    timings.append(time.perf_counter() - started)
+                latencies.extend(timings)
+                errors.append(failed)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=play, args=(user,)) for user in users]
+        for thread in workers:
+            thread.start()
+        start.wait()
+        started = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        writer.flush()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        percentile = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000 if latencies else 0.0
+        return {
+            'hands': len(latencies),
+            'seconds': elapsed,
+            'p50_ms': percentile(0.50),
+            'p99_ms': percentile(0.99),
+            'errors': sum(errors),
+        }
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from casino.blackjack import Blackjack
+from casino.strategy import MAX_TOTAL, PAIR_VALUES, UP_CARDS, Strategy, build_strategy
+
+
+class Command(BaseCommand):
+    help = 'ブラックジャックのベーシックストラテジー表を作成してファイルに保存する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--decks', type=int, default=Blackjack.SHOE_DECKS, help='シューのデッキ数')
+        parser.add_argument('--output', default=str(settings.BLACKJACK_STRATEGY_FILE), help='出力先ファイル')
+        parser.add_argument('--show', action='store_true', help='作成した表を表示する')
+
+    def handle(self, *args, **options):
+        data = build_strategy(options['decks'])
+        with open(options['output'], 'wb') as f:
+            f.write(data)
+        self.stdout.write(f"wrote {len(data)} bytes to {options['output']}")
+
+        if options['show']:
+            strategy = Strategy(data)
+            header = '      ' + ' '.join(f"{up:>2}" for up in range(1, UP_CARDS + 1))
+            for soft in (False, True):
+                self.stdout.write('soft' if soft else 'hard')
+                self.stdout.write(header)
+                for total in range(13 if soft else 4, MAX_TOTAL + 1):
+                    row = ' '.join(f"{strategy.action(total, soft, up)[0].upper():>2}" for up in range(1, UP_CARDS + 1))
+                    self.stdout.write(f"  {total:>2}  {row}")
+            self.stdout.write('pair')
+            self.stdout.write(header)
+            for value in range(1, PAIR_VALUES + 1):
+                row = ' '.join(f"{'P' if strategy.split(value, up) else '-':>2}" for up in range(1, UP_CARDS + 1))
+                self.stdout.write(f"  {value:>2}  {row}")
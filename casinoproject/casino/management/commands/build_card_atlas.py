@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from casino.card_atlas import build_atlas
+
+
+class Command(BaseCommand):
+    help = 'カード画像（52枚と裏面）を1枚のスプライト（PNG・WebP）にまとめ、位置のCSSを作成する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(settings.MEDIA_ROOT / 'image'), help='カード画像のディレクトリ')
+        parser.add_argument('--output', default=str(settings.CARD_ATLAS_DIR), help='出力先ディレクトリ')
+        parser.add_argument('--width', type=int, default=300, help='1枚の幅（ピクセル、表示幅の2倍が目安）')
+
+    def handle(self, *args, **options):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise CommandError('build_card_atlas requires Pillow (pip install Pillow)')
+        if options['width'] <= 0:
+            raise CommandError('--width must be positive')
+
+        for path in build_atlas(options['source'], options['output'], options['width']):
+            self.stdout.write(f"wrote {path.stat().st_size:,} bytes to {path}")
@@ -0,0 +1,60 @@
+import json
+import math
+import time
+from django.core.management.base import BaseCommand, CommandError
+from casino.sim.harness import GAMES, simulate
+
+
+class Command(BaseCommand):
+    help = 'ゲームクラスのルールでシミュレーションし、ハウスエッジを基準値と比較する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('games', nargs='*', default=list(GAMES), help='対象のゲーム（blackjack / baccarat）')
+        parser.add_argument('--hands', type=int, default=1_000_000, help='ゲームごとのハンド数')
+        parser.add_argument('--workers', type=int, default=None, help='ワーカープロセス数（省略時はCPU数）')
+        parser.add_argument('--seed', type=int, default=0, help='乱数シード')
+        parser.add_argument('--chunk-size', type=int, default=100_000, help='1タスクあたりのハンド数')
+        parser.add_argument('--baseline', help='基準値のJSONファイル')
+        parser.add_argument('--save-baseline', action='store_true', help='結果を基準値として保存する')
+        parser.add_argument('--tolerance', type=float, default=4.0, help='基準値との差の許容範囲（標準誤差の何倍か）')
+
+    def handle(self, *args, **options):
+        for game in options['games']:
+            if game not in GAMES:
+                raise CommandError(f"Unknown game: {game}")
+
+        results = {}
+        for game in options['games']:
+            started = time.perf_counter()
+            tally = simulate(game, options['hands'], options['workers'], options['seed'], options['chunk_size'])
+            elapsed = time.perf_counter() - started
+            results[game] = tally.report()
+            self.stdout.write(f"{game}: {options['hands']:,} hands in {elapsed:.1f}s "
+                              f"({options['hands'] / elapsed:,.0f} hands/s)")
+            for key, stats in results[game].items():
+                self.stdout.write(f"  {key:<9} edge {stats['house_edge']:+.4%} ± {stats['stderr']:.4%}")
+
+        baseline_path = options['baseline']
+        if not baseline_path:
+            return
+        if options['save_baseline']:
+            with open(baseline_path, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(f"saved baseline to {baseline_path}")
+            return
+
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        failures = []
+        for game, report in results.items():
+            for key, stats in report.items():
+                expected = baseline.get(game, {}).get(key)
+                if expected is None:
+                    continue
+                error = math.hypot(stats['stderr'], expected['stderr'])
+                diff = stats['house_edge'] - expected['house_edge']
+                if error and abs(diff) > options['tolerance'] * error:
+                    failures.append(f"{game}/{key}: {stats['house_edge']:+.4%} (baseline {expected['house_edge']:+.4%})")
+        if failures:
+            raise CommandError('House edge changed from baseline:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('house edge matches baseline'))
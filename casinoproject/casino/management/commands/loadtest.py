@@ -0,0 +1,58 @@
+import tempfile
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from accounts.models import CustomUser
+from casino.history import get_history_writer
+from casino.loadtest import run
+
+GAMES = ('baccarat', 'blackjack')
+
+
+class Command(BaseCommand):
+    help = '複数のプレイヤーでゲーム画面を同時に進め、エンドポイントごとの応答時間を表示する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('games', nargs='*', default=list(GAMES), help='対象のゲーム（baccarat / blackjack）')
+        parser.add_argument('--players', type=int, default=8, help='同時に遊ぶプレイヤー数（スレッド数）')
+        parser.add_argument('--rounds', type=int, default=20, help='プレイヤー・ゲームごとのラウンド数')
+        parser.add_argument('--seed', type=int, default=None, help='乱数シード')
+        parser.add_argument('--max-p95', type=float, default=None, help='p95（ミリ秒）がこれを超えるエンドポイントがあれば失敗')
+
+    def handle(self, *args, **options):
+        for game in options['games']:
+            if game not in GAMES:
+                raise CommandError(f"Unknown game: {game}")
+
+        # 一時的なDBとスプールで動かす（db.sqlite3やサーバーのスプールは触らない）
+        with tempfile.TemporaryDirectory() as tmp, override_settings(GAME_HISTORY_BUFFER={'SPOOL_DIR': Path(tmp) / 'spool'}):
+            connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(tmp) / 'loadtest.sqlite3')
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                users = [
+                    CustomUser.objects.create_user(f'loadtest{index}', money=10 ** 9)
+                    for index in range(options['players'])
+                ]
+                rows, elapsed = run(users, options['games'], options['rounds'], options['seed'])
+                get_history_writer().flush()
+            finally:
+                teardown_databases(old_config, verbosity=0)
+
+        total = sum(row['requests'] for row in rows)
+        self.stdout.write(f"{options['players']} players, {total:,} requests in {elapsed:.1f}s ({total / elapsed:,.0f} req/s)")
+        self.stdout.write(f"  {'endpoint':<24} {'requests':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>6}")
+        for row in rows:
+            self.stdout.write(
+                f"  {row['endpoint']:<24} {row['requests']:>8} {row['rps']:>8.1f} "
+                f"{row['p50_ms']:>6.1f}ms {row['p95_ms']:>6.1f}ms {row['p99_ms']:>6.1f}ms {row['errors']:>6}"
+            )
+
+        failures = [row['endpoint'] for row in rows if row['errors']]
+        if failures:
+            raise CommandError('Requests failed: ' + ', '.join(failures))
+        limit = options['max_p95']
+        if limit is not None:
+            slow = [f"{row['endpoint']} ({row['p95_ms']:.1f}ms)" for row in rows if row['p95_ms'] > limit]
+            if slow:
+                raise CommandError(f'p95 over {limit}ms: ' + ', '.join(slow))
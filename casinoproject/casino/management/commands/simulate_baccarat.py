@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from casino.bacarrat import Baccarat
+from casino.sim.baccarat import simulate
+
+
+class Command(BaseCommand):
+    help = 'バカラをシミュレーションし、勝率とハウスエッジを表示する'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hands', type=int, default=10_000_000, help='シミュレーションするハンド数')
+        parser.add_argument('--decks', type=int, default=Baccarat.SHOE_DECKS, help='シューのデッキ数')
+        parser.add_argument('--batch-size', type=int, default=1_000_000, help='1回にまとめて配るハンド数')
+        parser.add_argument('--seed', type=int, default=None, help='乱数シード')
+
+    def handle(self, *args, **options):
+        hands = options['hands']
+        started = time.perf_counter()
+        result = simulate(hands, options['decks'], options['batch_size'], options['seed'])
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"hands: {hands:,}  decks: {options['decks']}  "
+                          f"time: {elapsed:.2f}s ({hands / elapsed:,.0f} hands/s)")
+        for winner, count in result['wins'].items():
+            self.stdout.write(f"  {winner:<7} {count / hands:8.4%}")
+        self.stdout.write('house edge:')
+        for bet_type, payout in result['payout'].items():
+            self.stdout.write(f"  {bet_type:<7} {-payout / hands:+8.4%}")
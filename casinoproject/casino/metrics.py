@@ -0,0 +1,228 @@
+"""リクエストの処理時間の計測とPrometheus形式の出力
+
+MetricsMiddleware がビューごとに1リクエストの時間を計り、その間の処理を段階（phase）に分けて集計する。
+
+- engine: カードを配る・アクションを適用する（timed('engine')）
+- settle: 所持金と履歴の書き込み（timed('settle')）
+- render: テンプレートの描画（casino.rendering）
+- session: セッションの読み込み・保存のSQL
+- db: それ以外のSQL（件数も数える）
+
+集計はプロセスに1つの辞書にロックを取って足す（リクエストごとにスレッドが変わっても増えない）。
+settings.METRICS['MULTIPROCESS_DIR'] を指定すると、各プロセスが集計をファイルに書き出し、
+/metrics はすべてのプロセスの分を合計して返す（複数ワーカーのサーバー用）。
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from django.conf import settings
+from django.db import connection
+
+# ヒストグラムのバケット（秒）
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# 出力する指標（種類と説明）
+METRICS = {
+    'casino_request_seconds': ('histogram', 'Time spent handling a request.'),
+    'casino_phase_seconds': ('histogram', 'Time spent in each phase of a request.'),
+    'casino_db_queries_total': ('counter', 'SQL queries run while handling requests.'),
+}
+
+# マルチプロセスモードで集計をファイルに書き出す間隔（秒）
+WRITE_INTERVAL = 1.0
+
+# 処理中のリクエストの段階ごとの時間
+_current = ContextVar('casino_metrics', default=None)
+
+
+class RequestTimings:
+    """1リクエストの段階ごとの時間とSQLの件数"""
+
+    __slots__ = ('phases', 'queries')
+
+    def __init__(self):
+        self.phases = {}
+        self.queries = 0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper 用（SQLの時間を session / db に足す）"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add('session' if 'django_session' in sql else 'db', time.perf_counter() - start)
+
+
+def record(phase, seconds):
+    """処理中のリクエストの段階に時間を足す（リクエストの外なら何もしない）"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase):
+    """withの中の時間を段階に足す（デコレーターとしても使える）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+class Registry:
+    """プロセス内の集計
+
+    系列（指標名とラベルの組）ごとに、ヒストグラムはバケットごとの件数と合計、
+    カウンターは値を持つ。
+    """
+
+    def __init__(self):
+        self._store = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, labels, seconds):
+        """ヒストグラムに1件追加"""
+        with self._lock:
+            series = self._store.get((name, labels))
+            if series is None:
+                series = self._store[(name, labels)] = [0] * (len(BUCKETS) + 1) + [0.0]
+            series[bisect_left(BUCKETS, seconds)] += 1
+            series[-1] += seconds
+
+    def inc(self, name, labels, value=1):
+        """カウンターに加算"""
+        with self._lock:
+            series = self._store.get((name, labels))
+            if series is None:
+                series = self._store[(name, labels)] = [0]
+            series[0] += value
+
+    def snapshot(self):
+        """集計のコピー"""
+        with self._lock:
+            return {key: list(values) for key, values in self._store.items()}
+
+
+def merge(total, snapshot):
+    """集計を足し合わせる"""
+    for key, values in snapshot.items():
+        series = total.get(key)
+        if series is None:
+            total[key] = list(values)
+        else:
+            for index, value in enumerate(values):
+                series[index] += value
+    return total
+
+
+registry = Registry()
+
+
+class MetricsMiddleware:
+    """ビューごとにリクエストの処理時間と段階ごとの時間を集計する
+
+    セッションの保存も計れるように、MIDDLEWAREの先頭に置く。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = getattr(settings, 'METRICS', {})
+        self.directory = config.get('MULTIPROCESS_DIR')
+        self.last_write = time.monotonic()
+        if self.directory:
+            atexit.register(write_snapshot, self.directory)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        elapsed = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unresolved'
+        registry.observe('casino_request_seconds', (('view', view),), elapsed)
+        for phase, seconds in timings.phases.items():
+            registry.observe('casino_phase_seconds', (('view', view), ('phase', phase)), seconds)
+        registry.inc('casino_db_queries_total', (('view', view),), timings.queries)
+
+        if self.directory and time.monotonic() - self.last_write >= WRITE_INTERVAL:
+            self.last_write = time.monotonic()
+            write_snapshot(self.directory)
+        return response
+
+
+def write_snapshot(directory):
+    """このプロセスの集計をファイルに書き出す（書き終えてから置き換える）"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'metrics-{os.getpid()}.json'
+    temp = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+    data = [[name, labels, values] for (name, labels), values in registry.snapshot().items()]
+    temp.write_text(json.dumps(data), encoding='utf-8')
+    os.replace(temp, path)
+
+
+def collect():
+    """出力する集計（マルチプロセスモードならすべてのプロセスの合計）"""
+    directory = getattr(settings, 'METRICS', {}).get('MULTIPROCESS_DIR')
+    if not directory:
+        return registry.snapshot()
+    # 終了したプロセスのファイルも残して足す（カウンターが減らないように）
+    write_snapshot(directory)
+    total = {}
+    for path in Path(directory).glob('metrics-*.json'):
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            continue
+        merge(total, {(name, tuple(map(tuple, labels))): values for name, labels, values in data})
+    return total
+
+
+def format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def export():
+    """Prometheusのテキスト形式に変換"""
+    snapshot = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (series_name, labels), values in sorted(snapshot.items()):
+            if series_name != name:
+                continue
+            if kind == 'counter':
+                lines.append(f'{name}{format_labels(labels)} {values[0]}')
+                continue
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, '+Inf'), values):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {values[-1]}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
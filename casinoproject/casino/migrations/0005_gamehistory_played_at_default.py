@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casino', '0004_walletentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='gamehistory',
+            name='played_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casino', '0005_gamehistory_played_at_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlackjackHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('winner', models.CharField(choices=[('player', 'Player'), ('dealer', 'Dealer'), ('blackjack', 'Blackjack'), ('draw', 'Draw'), ('split', 'Split')], max_length=10)),
+                ('bet', models.IntegerField()),
+                ('payout', models.IntegerField()),
+                ('player_cards', models.BinaryField(max_length=32)),
+                ('dealer_cards', models.BinaryField(max_length=32)),
+                ('split_cards', models.BinaryField(blank=True, default=b'', max_length=64)),
+                ('split', models.BooleanField(default=False)),
+                ('played_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='blackjack_histories', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-played_at'],
+                'indexes': [models.Index(fields=['user', 'played_at'], name='casino_blac_user_id_ec66d8_idx')],
+            },
+        ),
+    ]
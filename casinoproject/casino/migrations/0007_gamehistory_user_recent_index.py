@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casino', '0006_blackjackhistory'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='gamehistory',
+            index=models.Index(fields=['user', '-played_at', '-id'], name='casino_gamehistory_user_recent'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('casino', '0007_gamehistory_user_recent_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='walletentry',
+            name='round_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='walletentry',
+            constraint=models.UniqueConstraint(fields=('user', 'round_id'), name='casino_walletentry_user_round'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from accounts.models import CustomUser
 
 class GameHistory(models.Model):
@@ -12,10 +13,90 @@ class GameHistory(models.Model):
     winner = models.CharField(max_length=10, choices=RESULT_CHOICES)
     player_score = models.IntegerField()
     banker_score = models.IntegerField()
-    played_at = models.DateTimeField(auto_now_add=True)
+    played_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         ordering = ['-played_at']
+        indexes = [
+            models.Index(fields=['user', '-played_at', '-id'], name='casino_gamehistory_user_recent'),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.winner} ({self.player_score} vs {self.banker_score})"
\ No newline at end of file
+        return f"{self.user.username} - {self.winner} ({self.player_score} vs {self.banker_score})"
+
+
+class BlackjackHistory(models.Model):
+    """ブラックジャック1ラウンドの記録（カードはカード番号のバイト列）"""
+    RESULT_CHOICES = [
+        ('player', 'Player'),
+        ('dealer', 'Dealer'),
+        ('blackjack', 'Blackjack'),
+        ('draw', 'Draw'),
+        ('split', 'Split'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='blackjack_histories')
+    winner = models.CharField(max_length=10, choices=RESULT_CHOICES)
+    bet = models.IntegerField()
+    payout = models.IntegerField()
+    player_cards = models.BinaryField(max_length=32)
+    dealer_cards = models.BinaryField(max_length=32)
+    # スプリットした各ハンド（枚数 + カード番号）を連結したもの
+    split_cards = models.BinaryField(max_length=64, blank=True, default=b'')
+    split = models.BooleanField(default=False)
+    played_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-played_at']
+        indexes = [
+            models.Index(fields=['user', 'played_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.winner} ({self.payout:+d})"
+
+    @staticmethod
+    def pack_hands(hands):
+        """手札のリストを split_cards の形式に変換"""
+        data = bytearray()
+        for cards in hands:
+            data.append(len(cards))
+            data += bytes(cards)
+        return bytes(data)
+
+    @property
+    def split_hands(self):
+        """split_cards をカード番号のリストに戻す"""
+        data = bytes(self.split_cards)
+        hands = []
+        offset = 0
+        while offset < len(data):
+            count = data[offset]
+            hands.append(list(data[offset + 1:offset + 1 + count]))
+            offset += 1 + count
+        return hands
+
+
+class WalletEntry(models.Model):
+    """所持金の増減の記録（追記のみ）"""
+    GAME_CHOICES = [
+        ('blackjack', 'Blackjack'),
+        ('baccarat', 'Baccarat'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='wallet_entries')
+    game = models.CharField(max_length=10, choices=GAME_CHOICES)
+    amount = models.IntegerField()
+    balance = models.IntegerField()
+    # 精算したラウンドのID（同じラウンドを二重に精算しない）
+    round_id = models.BigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'round_id'], name='casino_walletentry_user_round'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.game} {self.amount:+d} ({self.balance})"
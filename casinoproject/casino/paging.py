@@ -0,0 +1,46 @@
+"""履歴のキーセットページング
+
+OFFSETで読み飛ばすのではなく、前のページの最後の行の (played_at, id) より
+古い行を (user, -played_at) のインデックスから読むので、
+履歴が何十万件あってもページの取得時間は変わらない。
+"""
+import base64
+import struct
+from datetime import datetime, timezone
+from django.db.models import Q
+
+# カーソルの形式（played_at のUNIX時間（マイクロ秒）, id）
+_CURSOR = struct.Struct('>qq')
+
+
+def encode_cursor(played_at, pk):
+    """行の (played_at, id) をURL用の文字列に変換"""
+    micros = int(played_at.timestamp()) * 1_000_000 + played_at.microsecond
+    return base64.urlsafe_b64encode(_CURSOR.pack(micros, pk)).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """encode_cursor() の文字列を (played_at, id) に戻す（不正ならNone）"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        micros, pk = _CURSOR.unpack(raw)
+        seconds, micros = divmod(micros, 1_000_000)
+        # 範囲外の時刻（手で作ったカーソル）も不正として扱う
+        played_at = datetime.fromtimestamp(seconds, timezone.utc).replace(microsecond=micros)
+    except (ValueError, OverflowError, OSError, struct.error):
+        return None
+    return played_at, pk
+
+
+def keyset_page(queryset, cursor=None, page_size=50):
+    """新しい順に1ページ分の行と、次のページのカーソル（なければNone）を返す"""
+    queryset = queryset.order_by('-played_at', '-id')
+    position = decode_cursor(cursor) if cursor else None
+    if position is not None:
+        played_at, pk = position
+        queryset = queryset.filter(Q(played_at__lt=played_at) | Q(played_at=played_at, id__lt=pk))
+    rows = list(queryset[:page_size + 1])
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    return rows, encode_cursor(rows[-1].played_at, rows[-1].pk)
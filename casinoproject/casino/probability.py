@@ -0,0 +1,83 @@
+"""ブラックジャックのディーラー最終スコアの確率計算
+
+山札の構成は点数1(A)〜10ごとの残り枚数を並べたタプルで表す。
+同じ構成・同じ手札の計算結果はLRUキャッシュで共有する。
+"""
+from functools import lru_cache
+from .trump import CARD_VALUE
+
+# 結果タプルの並び（17〜21とバースト）
+DEALER_OUTCOMES = (17, 18, 19, 20, 21, 'bust')
+BUST = len(DEALER_OUTCOMES) - 1
+
+# キャッシュの上限（1エントリは数百バイト程度）
+DEALER_CACHE_SIZE = 1 << 18
+
+_NO_RESULT = (0.0,) * len(DEALER_OUTCOMES)
+
+
+def composition(cards):
+    """カード番号の並びから点数ごとの枚数タプルを作成"""
+    counts = [0] * 10
+    for card in cards:
+        counts[CARD_VALUE[card] - 1] += 1
+    return tuple(counts)
+
+
+def shoe_composition(shoe):
+    """山札の未配布カードの構成"""
+    return composition(shoe.cards[shoe.position:])
+
+
+@lru_cache(maxsize=DEALER_CACHE_SIZE)
+def _dealer_play(counts, hard, has_ace):
+    """ディーラーの手札(hard, has_ace)から最終スコアの確率分布を計算"""
+    score = hard + 10 if has_ace and hard <= 11 else hard
+    if hard > 21:
+        result = [0.0] * len(DEALER_OUTCOMES)
+        result[BUST] = 1.0
+        return tuple(result)
+    if score >= 17:
+        result = [0.0] * len(DEALER_OUTCOMES)
+        result[score - 17] = 1.0
+        return tuple(result)
+
+    total = sum(counts)
+    if not total:
+        return _NO_RESULT
+
+    result = [0.0] * len(DEALER_OUTCOMES)
+    for index, count in enumerate(counts):
+        if not count:
+            continue
+        value = index + 1
+        rest = counts[:index] + (count - 1,) + counts[index + 1:]
+        p = count / total
+        for outcome, q in enumerate(_dealer_play(rest, hard + value, has_ace or value == 1)):
+            result[outcome] += p * q
+    return tuple(result)
+
+
+def dealer_outcomes(counts, up_card_value):
+    """アップカードと残りの山札構成から、ディーラーの最終スコアの確率を返す
+
+    counts はアップカードを除いた点数1〜10ごとの残り枚数。
+    戻り値は DEALER_OUTCOMES の順の確率タプル。
+    """
+    return _dealer_play(tuple(counts), up_card_value, up_card_value == 1)
+
+
+def dealer_outcome_table(counts):
+    """アップカード1〜10ごとの確率分布をまとめて計算"""
+    table = {}
+    for index, count in enumerate(counts):
+        if not count:
+            continue
+        rest = counts[:index] + (count - 1,) + counts[index + 1:]
+        table[index + 1] = dealer_outcomes(rest, index + 1)
+    return table
+
+
+def cache_info():
+    """キャッシュの利用状況"""
+    return _dealer_play.cache_info()
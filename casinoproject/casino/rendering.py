@@ -0,0 +1,31 @@
+"""ゲーム画面のレンダリング時間の計測
+
+django.shortcuts.render と同じ使い方で、テンプレートの描画にかかった時間を
+Server-Timing ヘッダーと casino.metrics に載せる。settings.RENDER_BUDGET_MS を超えたらDEBUGレベルでログに残す
+（負荷が高いと予算を超え続けるので、警告にするとログが埋まる）。
+"""
+import logging
+import time
+from django.conf import settings
+from django.shortcuts import render as django_render
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# 予算の既定値（ミリ秒）
+DEFAULT_BUDGET_MS = 50
+
+
+def render(request, template_name, context=None, **kwargs):
+    """描画時間を計測しながらテンプレートを描画"""
+    start = time.perf_counter()
+    response = django_render(request, template_name, context, **kwargs)
+    elapsed = time.perf_counter() - start
+    metrics.record('render', elapsed)
+    elapsed *= 1000
+
+    response['Server-Timing'] = f'render;dur={elapsed:.2f}'
+    budget = getattr(settings, 'RENDER_BUDGET_MS', {}).get(template_name, DEFAULT_BUDGET_MS)
+    if elapsed > budget:
+        logger.debug('%s rendered in %.1fms (budget %dms)', template_name, elapsed, budget)
+    return response
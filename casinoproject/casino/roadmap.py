@@ -0,0 +1,203 @@
+"""バカラの罫線（ビーズプレート・大路・派生罫線）
+
+1ハンドごとに add() で結果を追加し、必要な列の長さだけを見て更新するので、
+履歴を読み直さずに罫線を保つ（1ハンドあたり定数時間）。
+
+- ビーズプレート: すべての結果（引き分けを含む）を順に並べたもの
+- 大路: 同じ勝者が続く間は同じ列、勝者が変わったら次の列（引き分けは直前のマスに数える）
+- 大眼仔・小路・蟑螂路: 大路の列の並び方が1・2・3列前と揃っているか（赤）、いないか（青）
+"""
+import base64
+import random
+import struct
+from array import array
+
+# 結果の番号
+PLAYER, BANKER, DRAW = 0, 1, 2
+RESULTS = ('player', 'banker', 'draw')
+# テンプレート用の記号
+MARKS = ('p', 'b', 'd')
+
+# ビーズプレートの行数
+BEAD_ROWS = 6
+
+# 派生罫線の色
+RED, BLUE = 0, 1
+COLORS = ('red', 'blue')
+
+# 派生罫線の名前と、比べる列の間隔
+DERIVED_ROADS = (
+    ('big_eye_boy', 1),
+    ('small_road', 2),
+    ('cockroach_pig', 3),
+)
+
+# 保存形式
+_VERSION = 3
+_HEADER = struct.Struct('>BIIH')
+_COUNT = struct.Struct('>H')
+
+
+class StreakRoad:
+    """同じ値が続く間は同じ列に並べる罫線（最初の値 + 各列の長さ）"""
+
+    __slots__ = ('first', 'lengths')
+
+    def __init__(self, first=0, lengths=()):
+        self.first = first
+        self.lengths = array('H', lengths)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def value(self, column):
+        """列の値（列ごとに交互に変わる）"""
+        return self.first ^ (column & 1)
+
+    def add(self, value):
+        """値を追加し、追加したマスの (列, 行) を返す"""
+        if not self.lengths:
+            self.first = value
+            self.lengths.append(1)
+        elif self.value(len(self.lengths) - 1) == value:
+            self.lengths[-1] += 1
+        else:
+            self.lengths.append(1)
+        return len(self.lengths) - 1, self.lengths[-1] - 1
+
+    def columns(self):
+        """列ごとの値のリスト"""
+        return [[self.value(column)] * length for column, length in enumerate(self.lengths)]
+
+
+class Roadmap:
+    """1つのテーブル（山札）の罫線"""
+
+    __slots__ = ('generation', 'serial', 'results', 'leading_draws', 'big_road', 'draws', 'derived')
+
+    def __init__(self, serial=0):
+        # 罫線を作り直すたびに変わる乱数（serialが0から数え直しても表示のキャッシュが重ならないように）
+        self.generation = random.getrandbits(32)
+        # 罫線が変わるたびに増える番号（表示のキャッシュのキー）
+        self.serial = serial
+        self.results = bytearray()
+        # 最初のプレイヤー・バンカーの勝ちより前の引き分けの数
+        self.leading_draws = 0
+        self.big_road = StreakRoad()
+        # 大路のマスごとの引き分けの数
+        self.draws = bytearray()
+        self.derived = [StreakRoad() for _ in DERIVED_ROADS]
+
+    def __len__(self):
+        return len(self.results)
+
+    def reset(self):
+        """新しい山札のために罫線を空にする"""
+        self.__init__(self.serial + 1)
+
+    def add(self, winner):
+        """1ハンドの結果（'player' / 'banker' / 'draw'）を追加"""
+        result = RESULTS.index(winner)
+        self.serial += 1
+        self.results.append(result)
+        if result == DRAW:
+            if self.draws:
+                self.draws[-1] = min(self.draws[-1] + 1, 255)
+            else:
+                self.leading_draws += 1
+            return
+
+        column, row = self.big_road.add(result)
+        self.draws.append(0)
+        for road, (_, gap) in zip(self.derived, DERIVED_ROADS):
+            color = self.derived_color(column, row, gap)
+            if color is not None:
+                road.add(color)
+
+    def derived_color(self, column, row, gap):
+        """大路の (列, 行) に置いたマスに対する派生罫線の色（まだ始まらなければNone）"""
+        if column < gap or (column == gap and row == 0):
+            return None
+        lengths = self.big_road.lengths
+        if row == 0:
+            # 新しい列: 直前の列と、そのgap列前の列の長さが同じなら赤
+            return RED if lengths[column - 1] == lengths[column - 1 - gap] else BLUE
+        # 同じ列: gap列前の同じ行にマスがあるか、その列が1つ上で終わっていなければ赤
+        compared = lengths[column - gap]
+        return BLUE if compared == row else RED
+
+    @property
+    def bead_plate(self):
+        """ビーズプレート（記号のリスト）"""
+        return [MARKS[result] for result in self.results]
+
+    @property
+    def bead_plate_columns(self):
+        """ビーズプレートをBEAD_ROWSごとの列に分けたもの"""
+        plate = self.bead_plate
+        return [plate[start:start + BEAD_ROWS] for start in range(0, len(plate), BEAD_ROWS)]
+
+    @property
+    def big_road_columns(self):
+        """大路の列ごとのマス（記号と引き分けの数）"""
+        columns = []
+        cell = 0
+        for column, length in enumerate(self.big_road.lengths):
+            mark = MARKS[self.big_road.value(column)]
+            cells = []
+            for _ in range(length):
+                draws = self.draws[cell]
+                if cell == 0:
+                    draws += self.leading_draws
+                cells.append({'mark': mark, 'draws': draws})
+                cell += 1
+            columns.append(cells)
+        return columns
+
+    @property
+    def derived_columns(self):
+        """派生罫線ごとの列（色のリスト）"""
+        return {
+            name: [[COLORS[color] for color in column] for column in road.columns()]
+            for road, (name, _) in zip(self.derived, DERIVED_ROADS)
+        }
+
+    def dumps(self):
+        """保存用の文字列に変換"""
+        data = bytearray(_HEADER.pack(_VERSION, self.generation, self.serial & 0xFFFFFFFF, self.leading_draws))
+        data += _COUNT.pack(len(self.results)) + self.results
+        for road in (self.big_road, *self.derived):
+            data.append(road.first)
+            data += _COUNT.pack(len(road.lengths))
+            data += struct.pack('>%dH' % len(road.lengths), *road.lengths)
+        data += _COUNT.pack(len(self.draws)) + self.draws
+        return base64.b64encode(data).decode('ascii')
+
+    @classmethod
+    def loads(cls, data):
+        """dumps()の文字列から復元（形式が違えばNone）"""
+        raw = base64.b64decode(data)
+        if not raw or raw[0] != _VERSION:
+            return None
+        roadmap = cls()
+        _, roadmap.generation, roadmap.serial, roadmap.leading_draws = _HEADER.unpack_from(raw)
+        offset = _HEADER.size
+
+        (count,) = _COUNT.unpack_from(raw, offset)
+        offset += _COUNT.size
+        roadmap.results = bytearray(raw[offset:offset + count])
+        offset += count
+
+        roads = []
+        for _ in range(1 + len(DERIVED_ROADS)):
+            first = raw[offset]
+            (count,) = _COUNT.unpack_from(raw, offset + 1)
+            offset += 1 + _COUNT.size
+            roads.append(StreakRoad(first, struct.unpack_from('>%dH' % count, raw, offset)))
+            offset += count * 2
+        roadmap.big_road, roadmap.derived = roads[0], roads[1:]
+
+        (count,) = _COUNT.unpack_from(raw, offset)
+        offset += _COUNT.size
+        roadmap.draws = bytearray(raw[offset:offset + count])
+        return roadmap
@@ -0,0 +1,91 @@
+"""バカラの罫線のHTML
+
+罫線が変わったときに Python でHTMLを組み立ててキャッシュしておき、
+ベット画面ではテンプレートのループを回さずにキャッシュから取り出す。
+キャッシュのキーは (ユーザー, 罫線の generation と serial) なので、古いHTMLが出ることはない
+（罫線が消えて作り直され、serialが0から数え直しても generation が変わる）。
+"""
+from django.core.cache import cache
+from django.utils.safestring import mark_safe
+
+# 表示する列数と、大路の最低の行数
+COLUMNS = 7
+MIN_ROWS = 5
+
+# キャッシュの保持時間（秒）
+TIMEOUT = 60 * 60
+
+# 派生罫線の表示名
+DERIVED_ROAD_LABELS = {
+    'big_eye_boy': 'Big Eye Boy',
+    'small_road': 'Small Road',
+    'cockroach_pig': 'Cockroach Pig',
+}
+
+_BIG_ROAD_MARKS = {
+    'p': '<span style="color: blue;">●</span>',
+    'b': '<span style="color: red;">○</span>',
+}
+
+
+def _draw_mark(draws):
+    if not draws:
+        return ''
+    count = str(draws) if draws > 1 else ''
+    return f'<span style="color: green;">／{count}</span>'
+
+
+def render_big_road(roadmap):
+    """大路のグリッド（最新のCOLUMNS列）"""
+    columns = roadmap.big_road_columns[-COLUMNS:]
+    rows = max([MIN_ROWS] + [len(column) for column in columns])
+    parts = [f'<div class="grid-container" style="grid-template-rows: repeat({rows}, 60px);">']
+    for index in range(COLUMNS):
+        column = columns[index] if index < len(columns) else ()
+        for row in range(rows):
+            if row < len(column):
+                cell = column[row]
+                parts.append(f'<div class="grid-item">{_BIG_ROAD_MARKS[cell["mark"]]}{_draw_mark(cell["draws"])}</div>')
+            else:
+                parts.append('<div class="grid-item"></div>')
+    parts.append('</div>')
+    return ''.join(parts)
+
+
+def _render_road(label, columns, css_class):
+    parts = [f'<div class="roadmap-road"><div class="roadmap-label">{label}</div><div class="roadmap-columns">']
+    for column in columns[-COLUMNS:]:
+        parts.append('<div class="roadmap-column">')
+        parts.extend(f'<span class="{css_class} {css_class}-{value}"></span>' for value in column)
+        parts.append('</div>')
+    parts.append('</div></div>')
+    return ''.join(parts)
+
+
+def render_roadmap(roadmap):
+    """大路・ビーズプレート・派生罫線のHTML"""
+    parts = [render_big_road(roadmap), '<div class="roadmap-panel">']
+    parts.append(_render_road('Bead Plate', roadmap.bead_plate_columns, 'bead'))
+    for name, columns in roadmap.derived_columns.items():
+        parts.append(_render_road(DERIVED_ROAD_LABELS[name], columns, 'derived'))
+    parts.append('</div>')
+    return ''.join(parts)
+
+
+def fragment_key(user, roadmap):
+    return 'roadmap_html:%s:%x:%s' % (user.pk, roadmap.generation, roadmap.serial)
+
+
+def store_roadmap_fragment(user, roadmap):
+    """罫線のHTMLを組み立ててキャッシュ"""
+    html = render_roadmap(roadmap)
+    cache.set(fragment_key(user, roadmap), html, TIMEOUT)
+    return mark_safe(html)
+
+
+def get_roadmap_fragment(user, roadmap):
+    """キャッシュ済みの罫線のHTML（なければ組み立てる）"""
+    html = cache.get(fragment_key(user, roadmap))
+    if html is None:
+        return store_roadmap_fragment(user, roadmap)
+    return mark_safe(html)
@@ -0,0 +1,77 @@
+import base64
+import random
+import struct
+from array import array
+from .trump import DECK_SIZE
+
+# position, cut_card の2つを先頭に詰める
+_HEADER = struct.Struct('>HH')
+
+class Shoe:
+    """複数デッキをまとめた山札（カード番号0-51の並び + 配布位置）"""
+
+    __slots__ = ('cards', 'position', 'cut_card')
+
+    def __init__(self, decks=1, penetration=1.0, rng=None):
+        self.cards = array('B', range(DECK_SIZE)) * decks
+        self.cut_card = int(len(self.cards) * penetration)
+        self.shuffle(rng)
+
+    def __len__(self):
+        """残りのカード枚数"""
+        return len(self.cards) - self.position
+
+    @property
+    def decks(self):
+        return len(self.cards) // DECK_SIZE
+
+    @property
+    def needs_shuffle(self):
+        """カットカードに到達したか"""
+        return self.position >= self.cut_card
+
+    @property
+    def penetration(self):
+        """配布済みの割合"""
+        return self.position / len(self.cards)
+
+    def shuffle(self, rng=None):
+        """全カードを戻してシャッフル"""
+        (rng or random).shuffle(self.cards)
+        self.position = 0
+
+    def draw(self):
+        """次のカードを1枚取得"""
+        if self.position >= len(self.cards):
+            raise ValueError("No cards remaining to draw.")
+        card = self.cards[self.position]
+        self.position += 1
+        return card
+
+    def dumps(self):
+        """セッション保存用の文字列に変換"""
+        data = _HEADER.pack(self.position, self.cut_card) + self.cards.tobytes()
+        return base64.b64encode(data).decode('ascii')
+
+    @classmethod
+    def loads(cls, data):
+        """dumps()の文字列から復元"""
+        raw = base64.b64decode(data)
+        shoe = cls.__new__(cls)
+        shoe.position, shoe.cut_card = _HEADER.unpack_from(raw)
+        shoe.cards = array('B', raw[_HEADER.size:])
+        return shoe
+
+
+def load_shoe(store, key, decks, penetration):
+    """ストアからテーブルの山札を取得（なければ新しくシャッフル）"""
+    data = store.get(key)
+    shoe = Shoe.loads(data) if data else None
+    if shoe is None or shoe.decks != decks:
+        shoe = Shoe(decks, penetration)
+    return shoe
+
+
+def save_shoe(store, key, shoe):
+    """テーブルの山札をストアに保存"""
+    store.set(key, shoe.dumps())
@@ -0,0 +1,94 @@
+"""バカラのモンテカルロシミュレーション（HTTPリクエストを介さずNumPyでまとめて配る）"""
+import numpy as np
+from ..bacarrat import Baccarat
+from ..engine.baccarat import BaccaratEngine
+from ..trump import CARD_VALUE
+
+WINNERS = ('player', 'banker', 'draw')
+BET_TYPES = ('player', 'banker', 'draw')
+
+PLAYER_DRAWS = 1
+BANKER_DRAWS = 2
+
+# 1デッキに含まれる各点数(0-9)のカード枚数
+DECK_COMPOSITION = np.bincount([value % 10 for value in CARD_VALUE], minlength=10)
+
+
+def build_draw_table():
+    """BaccaratEngine.should_draw_third_cardから10×10の引き判定表を作成
+
+    [プレイヤー点数, バンカー点数] に PLAYER_DRAWS / BANKER_DRAWS のビットを持つ。
+    BaccaratEngine.deal と同じく最初の2枚ずつの点数だけで判定する
+    （バンカーの判定にプレイヤーの3枚目は使わない）
+    """
+    table = np.zeros((10, 10), dtype=np.uint8)
+    for player_score in range(10):
+        for banker_score in range(10):
+            player_draws, banker_draws = BaccaratEngine.should_draw_third_card(player_score, banker_score)
+            table[player_score, banker_score] = PLAYER_DRAWS * player_draws + BANKER_DRAWS * banker_draws
+    return table
+
+
+def build_payout_table():
+    """calculate_payoutから[勝者, ベット種類]の損益表を作成（ベット1単位）"""
+    return np.array([
+        [BaccaratEngine.calculate_payout(winner, bet_type, 1) for bet_type in BET_TYPES]
+        for winner in WINNERS
+    ], dtype=np.int64)
+
+
+DRAW_TABLE = build_draw_table()
+PAYOUT_TABLE = build_payout_table()
+
+
+def deal_values(rng, hands, decks):
+    """1ハンド分(最大6枚)の点数を新しいシューから非復元抽出で配る
+
+    シュー内の位置を6つ選び、同じ位置が重複した行だけ引き直す
+    """
+    shoe = np.repeat(np.arange(10), DECK_COMPOSITION * decks)
+    positions = rng.integers(0, len(shoe), size=(hands, 6))
+    rows = np.arange(hands)
+    while len(rows):
+        ordered = np.sort(positions[rows], axis=1)
+        rows = rows[(ordered[:, 1:] == ordered[:, :-1]).any(axis=1)]
+        positions[rows] = rng.integers(0, len(shoe), size=(len(rows), 6))
+    return shoe[positions]
+
+
+def play_hands(rng, hands, decks):
+    """hands回分のバカラを実行し、勝者のインデックス(WINNERSの順)を返す"""
+    values = deal_values(rng, hands, decks)
+    player_score = (values[:, 0] + values[:, 1]) % 10
+    banker_score = (values[:, 2] + values[:, 3]) % 10
+
+    draws = DRAW_TABLE[player_score, banker_score]
+    player_draws = (draws & PLAYER_DRAWS) != 0
+    banker_draws = (draws & BANKER_DRAWS) != 0
+    # プレイヤーが引かなかった場合、バンカーは5枚目を引く
+    banker_third = np.where(player_draws, values[:, 5], values[:, 4])
+
+    player_score = np.where(player_draws, (player_score + values[:, 4]) % 10, player_score)
+    banker_score = np.where(banker_draws, (banker_score + banker_third) % 10, banker_score)
+
+    winner = np.full(hands, 2, dtype=np.intp)
+    winner[player_score > banker_score] = 0
+    winner[banker_score > player_score] = 1
+    return winner
+
+
+def simulate(hands, decks=Baccarat.SHOE_DECKS, batch_size=1_000_000, seed=None):
+    """シミュレーションを実行し、勝者ごとの回数とベット種類ごとの損益合計を返す"""
+    rng = np.random.default_rng(seed)
+    wins = np.zeros(len(WINNERS), dtype=np.int64)
+    remaining = hands
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        wins += np.bincount(play_hands(rng, size, decks), minlength=len(WINNERS))
+        remaining -= size
+    payout = wins @ PAYOUT_TABLE
+    return {
+        'hands': hands,
+        'wins': dict(zip(WINNERS, wins.tolist())),
+        'payout': dict(zip(BET_TYPES, payout.tolist())),
+    }
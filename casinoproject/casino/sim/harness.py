@@ -0,0 +1,130 @@
+"""ゲームエンジンでハンドを進めるハウスエッジ計測用シミュレーション
+
+HTTPリクエストやDBを使わず、ビューと同じ BlackjackEngine / BaccaratEngine でハンドを進める。
+ハンド数を固定サイズのチャンクに分け、チャンクごとに SeedSequence から
+独立した乱数列を割り当てるので、ワーカー数を変えても結果は同じになる。
+"""
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ..bacarrat import Baccarat
+from ..blackjack import Blackjack
+from ..engine import BaccaratEngine, BlackjackEngine
+from ..shoe import Shoe
+from ..strategy import Strategy, build_strategy, get_strategy
+from ..trump import CARD_VALUE
+
+# 1ハンドのベット額（ブラックジャックの1.5倍配当の切り捨てを避けるため100）
+BET_AMOUNT = 100
+
+
+class Tally:
+    """ベット種類ごとの損益の合計・二乗和"""
+
+    def __init__(self, data=None):
+        self.data = data or {}
+
+    def add(self, key, payout):
+        stats = self.data.setdefault(key, [0, 0, 0])
+        stats[0] += 1
+        stats[1] += payout
+        stats[2] += payout * payout
+
+    def merge(self, other):
+        for key, (n, total, squares) in other.data.items():
+            stats = self.data.setdefault(key, [0, 0, 0])
+            stats[0] += n
+            stats[1] += total
+            stats[2] += squares
+        return self
+
+    def report(self):
+        """ベット1単位あたりのハウスエッジと標準誤差"""
+        report = {}
+        for key, (n, total, squares) in sorted(self.data.items()):
+            mean = total / n / BET_AMOUNT
+            variance = max(squares / n / BET_AMOUNT ** 2 - mean ** 2, 0.0)
+            report[key] = {
+                'hands': n,
+                'house_edge': -mean,
+                'stderr': math.sqrt(variance / n),
+            }
+        return report
+
+
+def choose_blackjack_action(strategy, state):
+    """判断表からアクションを選ぶ"""
+    up_card = CARD_VALUE[state.dealer.cards[0]]
+    if state.split_prompt:
+        return ('split_yes' if strategy.hint(state.player, up_card, True) == 'split' else 'split_no'), None
+    if state.split_active:
+        for index, hand in enumerate(state.split_hands):
+            if hand.status == 'playing':
+                action = strategy.action(hand.score, hand.soft, up_card)
+                return ('split_hit' if action == 'hit' else 'split_stand'), index
+    return strategy.action(state.player.score, state.player.soft, up_card), None
+
+
+def play_blackjack(hands, seed):
+    """ブラックジャックをhands回実行（ベーシックストラテジーでプレイ）"""
+    rng = random.Random(seed)
+    engine = BlackjackEngine(Shoe(Blackjack.SHOE_DECKS, Blackjack.SHOE_PENETRATION, rng), rng)
+    strategy = get_strategy() or Strategy(build_strategy(Blackjack.SHOE_DECKS))
+    tally = Tally()
+
+    for _ in range(hands):
+        state = engine.deal(BET_AMOUNT, BET_AMOUNT * 2)
+        while not state.game_over:
+            action, hand_index = choose_blackjack_action(strategy, state)
+            engine.apply(state, action, hand_index)
+        tally.add('blackjack', engine.settle(state))
+    return tally.data
+
+
+def play_baccarat(hands, seed):
+    """バカラをhands回実行し、3種類のベットの損益を同時に集計"""
+    rng = random.Random(seed)
+    engine = BaccaratEngine(Shoe(Baccarat.SHOE_DECKS, Baccarat.SHOE_PENETRATION, rng), rng)
+    tally = Tally()
+
+    for _ in range(hands):
+        state = engine.deal(BET_AMOUNT, 'player')
+        engine.apply(state, 'draw')
+        for bet_type in BaccaratEngine.BET_TYPES:
+            tally.add(bet_type, engine.calculate_payout(state.winner, bet_type, BET_AMOUNT))
+    return tally.data
+
+
+GAMES = {
+    'blackjack': play_blackjack,
+    'baccarat': play_baccarat,
+}
+
+
+def _init_worker():
+    """spawn方式のワーカーでもゲームクラスを使えるようにDjangoを初期化"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def chunk_seeds(seed, chunks):
+    """チャンクごとに独立した乱数シードを生成"""
+    return [int(s.generate_state(1, np.uint64)[0]) for s in np.random.SeedSequence(seed).spawn(chunks)]
+
+
+def simulate(game, hands, workers=None, seed=0, chunk_size=100_000):
+    """プロセスプールでシミュレーションを実行し、Tallyを返す"""
+    play = GAMES[game]
+    sizes = [chunk_size] * (hands // chunk_size)
+    if hands % chunk_size:
+        sizes.append(hands % chunk_size)
+    seeds = chunk_seeds(seed, len(sizes))
+
+    tally = Tally()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        for data in executor.map(play, sizes, seeds):
+            tally.merge(Tally(data))
+    return tally
@@ -0,0 +1,201 @@
+"""進行中のラウンドと山札の保存先
+
+アクションのたびにDBのセッション行を読み書きしないよう、ゲーム状態は
+settings.GAME_STATE_STORE で選んだストアに置く。
+
+- 'local': プロセス内のLRU（単一プロセスでの運用向け。ワーカーが複数あると
+  ワーカーごとに別のストアになり、別のワーカーが受けたリクエストではラウンドが見つからない）
+- 'redis': Redis互換サーバー（GET / SET EX / DEL だけを使う）
+"""
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+
+class StateStoreError(Exception):
+    """ストアとの通信に失敗"""
+
+
+class LocalStateStore:
+    """プロセス内のLRUストア（古いものから追い出す）"""
+
+    def __init__(self, max_entries=10000, timeout=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        """値を取得（なければ・期限切れならNone）"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """値を保存"""
+        expires = time.monotonic() + self.timeout if self.timeout else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """値を削除"""
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class RedisStateStore:
+    """Redisプロトコル（RESP）で話すストア
+
+    外部ライブラリは使わず、1本のソケットをロックで共有する。
+    通信に失敗した接続は捨て、次のコマンドで繋ぎ直す。
+    """
+
+    def __init__(self, location='redis://127.0.0.1:6379/0', timeout=None, prefix='casino', socket_timeout=1.0):
+        url = urlparse(location)
+        self.host = url.hostname or '127.0.0.1'
+        self.port = url.port or 6379
+        self.password = url.password
+        self.db = int(url.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self.prefix = prefix
+        self.socket_timeout = socket_timeout
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), self.socket_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._file = sock.makefile('rb')
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.db:
+            self._call('SELECT', self.db)
+
+    def close(self):
+        """接続を閉じる"""
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            finally:
+                self._sock = None
+                self._file = None
+
+    @staticmethod
+    def _encode(args):
+        """コマンドをRESPの配列に変換"""
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode()
+            elif isinstance(arg, int):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read_reply(self):
+        """RESPの応答を1つ読む"""
+        line = self._file.readline()
+        if not line.endswith(b'\r\n'):
+            raise StateStoreError('Connection closed by server.')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode()
+        if kind == b'-':
+            raise StateStoreError(body.decode())
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(body)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise StateStoreError('Unknown reply: %r' % line)
+
+    def _call(self, *args):
+        self._sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def command(self, *args):
+        """コマンドを1つ実行して応答を返す"""
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                return self._call(*args)
+            except OSError as exc:
+                self.close()
+                raise StateStoreError(str(exc)) from exc
+            except StateStoreError:
+                self.close()
+                raise
+
+    def _key(self, key):
+        return '%s:%s' % (self.prefix, key)
+
+    def get(self, key):
+        """値を取得（なければNone）"""
+        value = self.command('GET', self._key(key))
+        return value.decode() if value is not None else None
+
+    def set(self, key, value):
+        """値を保存"""
+        if self.timeout:
+            self.command('SET', self._key(key), value, 'EX', int(self.timeout))
+        else:
+            self.command('SET', self._key(key), value)
+
+    def delete(self, key):
+        """値を削除"""
+        self.command('DEL', self._key(key))
+
+
+BACKENDS = {
+    'local': LocalStateStore,
+    'redis': RedisStateStore,
+}
+
+_store = None
+
+
+def create_state_store(config):
+    """設定の辞書からストアを作成"""
+    options = {key.lower(): value for key, value in config.items() if key != 'BACKEND'}
+    return BACKENDS[config.get('BACKEND', 'local')](**options)
+
+
+def get_state_store():
+    """settings.GAME_STATE_STORE のストア（最初の呼び出しで作成）"""
+    global _store
+    if _store is None:
+        from django.conf import settings
+        _store = create_state_store(getattr(settings, 'GAME_STATE_STORE', {}))
+    return _store
+
+
+def user_key(user, name):
+    """ユーザーごとのゲーム状態のキー"""
+    return '%s:%s' % (name, user.pk)
@@ -0,0 +1,129 @@
+// ブラックジャックのHIT / STANDをページを読み直さずに反映する
+// アクションAPIが返す差分（新しいカード・スコア・状態）だけを画面に当てはめ、
+// 決着したときやスプリットの開始など画面の形が変わるときは通常の表示に戻す
+(function () {
+    'use strict';
+
+    var container = document.querySelector('.blackjack-container');
+    var imagesScript = document.getElementById('card-images');
+    if (!container || !imagesScript || !window.fetch || !window.FormData) {
+        return;
+    }
+
+    var images = JSON.parse(imagesScript.textContent);
+    var splitActive = document.querySelector('.split-hand-panel') !== null;
+
+    // 差分で反映できるアクション
+    var IN_PLACE_ACTIONS = ['hit', 'split_hit', 'split_stand'];
+    var STATUS_LABELS = {
+        standing: 'STANDING...',
+        bust: 'BURST',
+        blackjack: 'BLACKJACK'
+    };
+
+    function addCards(target, cards) {
+        cards.forEach(function (card) {
+            var wrapper = document.createElement('div');
+            var img = document.createElement('img');
+            wrapper.className = 'card';
+            img.src = images[card].src;
+            img.alt = images[card].alt;
+            if (images[card].sprite) {
+                img.className = images[card].sprite;
+            }
+            wrapper.appendChild(img);
+            target.appendChild(wrapper);
+        });
+    }
+
+    function updateHint(hint) {
+        var element = document.getElementById('strategy-hint');
+        if (!hint) {
+            if (element) {
+                element.remove();
+            }
+            return;
+        }
+        if (!element) {
+            element = document.createElement('div');
+            element.className = 'strategy-hint';
+            element.id = 'strategy-hint';
+            document.getElementById('player-score').after(element);
+        }
+        element.textContent = 'HINT: ' + hint.toUpperCase();
+    }
+
+    function updateSplitHand(index, hand) {
+        var panel = document.querySelector('.split-hand-panel[data-hand-index="' + index + '"]');
+        if (!panel) {
+            return;
+        }
+        var cards = panel.querySelector('.split-hand-cards');
+        addCards(cards, hand.cards);
+        cards.dataset.count = cards.children.length;
+        panel.querySelector('.split-hand-score').textContent = 'Score: ' + hand.score;
+
+        if (hand.status !== 'playing') {
+            // 入力が終わったハンドのボタンを外し、状態を表示
+            panel.querySelectorAll('.split-action-form').forEach(function (form) {
+                var placeholder = document.createElement('div');
+                placeholder.className = 'split-button-placeholder';
+                form.replaceWith(placeholder);
+            });
+            var status = panel.querySelector('.hand-status');
+            if (!status) {
+                status = document.createElement('div');
+                panel.querySelector('.split-hand-score').after(status);
+            }
+            status.className = 'hand-status ' + hand.status;
+            status.textContent = STATUS_LABELS[hand.status] || '';
+        }
+    }
+
+    function applyDelta(delta) {
+        if (delta.game_over || delta.split_active !== splitActive) {
+            // 決着した結果は通常の表示で見せる
+            window.location.assign(container.dataset.pageUrl);
+            return;
+        }
+        if (delta.split_active) {
+            delta.split_hands.forEach(function (hand, index) {
+                updateSplitHand(index, hand);
+            });
+            return;
+        }
+        addCards(document.getElementById('player-cards'), delta.player.cards);
+        document.getElementById('player-score').textContent = 'Score: ' + delta.player.score;
+        updateHint(delta.strategy_hint);
+    }
+
+    document.addEventListener('submit', function (event) {
+        var form = event.target;
+        var button = event.submitter;
+        if (!button || IN_PLACE_ACTIONS.indexOf(button.value) === -1) {
+            return;
+        }
+        event.preventDefault();
+
+        var data = new FormData(form);
+        data.set('action', button.value);
+        button.disabled = true;
+        fetch(container.dataset.actionUrl, {
+            method: 'POST',
+            body: data,
+            credentials: 'same-origin',
+            headers: {'X-Requested-With': 'XMLHttpRequest'}
+        }).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        }).then(function (delta) {
+            button.disabled = false;
+            applyDelta(delta);
+        }).catch(function () {
+            // アクションが適用済みかもしれないので送り直さず、画面を読み直して今の状態を表示
+            window.location.assign(container.dataset.pageUrl);
+        });
+    });
+})();
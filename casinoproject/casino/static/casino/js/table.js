@@ -0,0 +1,155 @@
+// WebSocketのテーブル: ベットやアクションを1メッセージで送り、配られたカードと精算を受け取る
+// バカラはベットの締め切りまでカウントダウンし、締め切ったらテーブルの全員に配られる
+(function () {
+    'use strict';
+
+    var root = document.querySelector('.live-table');
+    if (!root || !window.WebSocket) {
+        return;
+    }
+
+    var game = root.dataset.game;
+    var images = JSON.parse(document.getElementById('card-images').textContent);
+    var scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+    var socket = new WebSocket(scheme + window.location.host + root.dataset.socketPath);
+    var you = null;
+    var playerCards = [];
+
+    function log(text) {
+        var item = document.createElement('li');
+        item.textContent = text;
+        var list = document.getElementById('live-log');
+        list.insertBefore(item, list.firstChild);
+        while (list.children.length > 30) {
+            list.removeChild(list.lastChild);
+        }
+    }
+
+    function showCards(groups) {
+        var area = document.getElementById('live-cards');
+        area.textContent = '';
+        groups.forEach(function (cards) {
+            var group = document.createElement('div');
+            group.className = 'live-hand';
+            cards.forEach(function (card) {
+                var wrapper = document.createElement('div');
+                var img = document.createElement('img');
+                wrapper.className = 'card';
+                img.src = images[card].src;
+                img.alt = images[card].alt;
+                if (images[card].sprite) {
+                    img.className = images[card].sprite;
+                }
+                wrapper.appendChild(img);
+                group.appendChild(wrapper);
+            });
+            area.appendChild(group);
+        });
+    }
+
+    // ベットの締め切りまでのカウントダウン
+    var deadline = null;
+    var countdownTimer = null;
+
+    function showBetting(message) {
+        if (message.seats) {
+            document.getElementById('live-seats').textContent = message.seats.map(function (name, index) {
+                return (index + 1) + ':' + (name || '-');
+            }).join(' ');
+        }
+        window.clearInterval(countdownTimer);
+        var countdown = document.getElementById('live-countdown');
+        if (message.closes_in === null) {
+            countdown.textContent = '-';
+            return;
+        }
+        deadline = Date.now() + message.closes_in * 1000;
+        countdownTimer = window.setInterval(function () {
+            countdown.textContent = Math.max(Math.ceil((deadline - Date.now()) / 1000), 0);
+        }, 200);
+    }
+
+    function send(message) {
+        if (socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify(message));
+        }
+    }
+
+    var handlers = {
+        table: function (message) {
+            you = message.you;
+            handlers.joined(message);
+            if (message.seats) {
+                showBetting(message);
+            }
+        },
+        joined: function (message) {
+            document.getElementById('live-players').textContent = message.players.join(', ');
+        },
+        left: function (message) {
+            handlers.joined(message);
+        },
+        bets: function (message) {
+            showBetting(message);
+            log('BET: ' + message.bets.map(function (bet) {
+                return bet.player + ' ' + bet.bet_type + ' ' + bet.amount;
+            }).join(' / '));
+        },
+        deal: function (message) {
+            showBetting({seats: null, closes_in: null});
+            showCards([message.player_cards, message.banker_cards]);
+            log('Player ' + message.player_score + ' - Banker ' + message.banker_score + ' : ' + message.winner.toUpperCase());
+            message.settlements.forEach(function (settlement) {
+                if (settlement.player === you) {
+                    document.getElementById('live-money').textContent = settlement.money;
+                }
+            });
+        },
+        delta: function (message) {
+            // 差分は新しいカードだけなので、配られたカードを溜めておく
+            playerCards = playerCards.concat(message.player.cards);
+            showCards([playerCards, message.dealer ? message.dealer.cards : [message.dealer_up]]);
+            document.getElementById('live-money').textContent = message.money;
+            if (message.game_over) {
+                playerCards = [];
+            } else if (message.strategy_hint) {
+                log('Score ' + message.player.score + ' HINT: ' + message.strategy_hint.toUpperCase());
+            }
+        },
+        result: function (message) {
+            log(message.player + ': ' + message.winner.toUpperCase() + ' (' + message.payout + ')');
+        },
+        error: function (message) {
+            log('ERROR: ' + message.error);
+        }
+    };
+
+    socket.addEventListener('message', function (event) {
+        var message = JSON.parse(event.data);
+        var handler = handlers[message.type];
+        if (handler) {
+            handler(message);
+        }
+    });
+    socket.addEventListener('close', function () {
+        log('disconnected');
+    });
+
+    document.getElementById('live-bet').addEventListener('submit', function (event) {
+        event.preventDefault();
+        var form = event.target;
+        var amount = parseInt(form.elements.amount.value, 10);
+        if (game === 'baccarat') {
+            send({type: 'bet', bet_type: form.elements.bet_type.value, amount: amount});
+        } else {
+            playerCards = [];
+            send({type: 'deal', amount: amount});
+        }
+    });
+
+    root.querySelectorAll('.live-actions button').forEach(function (button) {
+        button.addEventListener('click', function () {
+            send({type: 'action', action: button.dataset.action});
+        });
+    });
+})();
@@ -0,0 +1,187 @@
+"""ブラックジャックのベーシックストラテジー表（ヒット/スタンド/スプリット）
+
+build_strategy() でこのテーブルのルールに合わせた期待値から判断表を作り、
+バイナリファイルに書き出す。実行時は mmap で読み込んだ表を引くだけ。
+"""
+import mmap
+import struct
+from functools import lru_cache
+from .probability import DEALER_OUTCOMES, BUST, composition, dealer_outcomes
+from .trump import CARD_VALUE, DECK_SIZE
+
+STAND = 0
+HIT = 1
+ACTION_NAMES = {STAND: 'stand', HIT: 'hit'}
+
+MAX_TOTAL = 21
+UP_CARDS = 10
+PAIR_VALUES = 10
+
+# magic, version, 合計点の数, アップカードの数, ペアの数
+_HEADER = struct.Struct('>4sBBBB')
+_MAGIC = b'BJST'
+_VERSION = 1
+_ACTION_SIZE = (MAX_TOTAL + 1) * 2 * UP_CARDS
+_FILE_SIZE = _HEADER.size + _ACTION_SIZE + PAIR_VALUES * UP_CARDS
+
+BLACKJACK_PAYOUT = 1.5
+
+
+def _score(hard, has_ace):
+    return hard + 10 if has_ace and hard <= 11 else hard
+
+
+class StrategyBuilder:
+    """デッキ数から期待値を計算し、判断表を作成する"""
+
+    def __init__(self, decks):
+        self.counts = composition(list(range(DECK_SIZE)) * decks)
+        total = sum(self.counts)
+        self.card_probs = [count / total for count in self.counts]
+        self.dealer = {}
+        for up in range(1, UP_CARDS + 1):
+            rest = list(self.counts)
+            rest[up - 1] -= 1
+            self.dealer[up] = dealer_outcomes(rest, up)
+        self.best_ev = lru_cache(maxsize=None)(self.best_ev)
+        self.hit_ev = lru_cache(maxsize=None)(self.hit_ev)
+
+    def stand_ev(self, score, up, blackjack=False):
+        """スタンドした場合の期待値（handle_resultの配当に合わせる）"""
+        if score > 21:
+            return -1.0
+        dist = self.dealer[up]
+        win = 0.0
+        lose = 0.0
+        for outcome, p in enumerate(dist):
+            if outcome == BUST:
+                win += p
+            elif score > DEALER_OUTCOMES[outcome]:
+                win += p
+            elif score < DEALER_OUTCOMES[outcome]:
+                lose += p
+        return win * (BLACKJACK_PAYOUT if blackjack else 1.0) - lose
+
+    def hit_ev(self, hard, has_ace, up):
+        """1枚引いた後、最善手を取り続けた場合の期待値"""
+        ev = 0.0
+        for index, p in enumerate(self.card_probs):
+            value = index + 1
+            ev += p * self.best_ev(hard + value, has_ace or value == 1, up)
+        return ev
+
+    def best_ev(self, hard, has_ace, up):
+        """ヒット/スタンドのうち期待値の高い方"""
+        if hard > 21:
+            return -1.0
+        score = _score(hard, has_ace)
+        stand = self.stand_ev(score, up)
+        if score == 21:
+            return stand
+        return max(stand, self.hit_ev(hard, has_ace, up))
+
+    def split_hand_ev(self, value, up):
+        """スプリット後の1ハンドの期待値（Aは1回だけヒット可能）"""
+        ev = 0.0
+        for index, p in enumerate(self.card_probs):
+            second = index + 1
+            hard = value + second
+            has_ace = value == 1 or second == 1
+            score = _score(hard, has_ace)
+            if score == 21:
+                hand_ev = self.stand_ev(score, up, blackjack=True)
+            elif value == 1:
+                hit_once = sum(
+                    q * self.stand_ev(_score(hard + j + 1, True), up)
+                    for j, q in enumerate(self.card_probs)
+                )
+                hand_ev = max(self.stand_ev(score, up), hit_once)
+            else:
+                hand_ev = self.best_ev(hard, has_ace, up)
+            ev += p * hand_ev
+        return ev
+
+    def action(self, total, soft, up):
+        """合計点・ソフトかどうか・アップカードから最善手"""
+        hard = total - 10 if soft else total
+        if total >= 21 or hard < 2:
+            return STAND
+        stand = self.stand_ev(total, up)
+        return HIT if self.hit_ev(hard, soft, up) > stand else STAND
+
+    def split(self, value, up):
+        """ペアをスプリットすべきか（ベット2倍分の期待値で比較）"""
+        hard = value * 2
+        no_split = self.best_ev(hard, value == 1, up)
+        return 2 * self.split_hand_ev(value, up) > no_split
+
+    def build(self):
+        """判断表をバイト列にまとめる"""
+        data = bytearray(_HEADER.pack(_MAGIC, _VERSION, MAX_TOTAL + 1, UP_CARDS, PAIR_VALUES))
+        for total in range(MAX_TOTAL + 1):
+            for soft in (False, True):
+                for up in range(1, UP_CARDS + 1):
+                    data.append(self.action(total, soft, up))
+        for value in range(1, PAIR_VALUES + 1):
+            for up in range(1, UP_CARDS + 1):
+                data.append(self.split(value, up))
+        return bytes(data)
+
+
+def build_strategy(decks):
+    """判断表のバイト列を作成"""
+    return StrategyBuilder(decks).build()
+
+
+class Strategy:
+    """mmapで読み込んだ判断表"""
+
+    __slots__ = ('table',)
+
+    def __init__(self, table):
+        magic, version, totals, ups, pairs = _HEADER.unpack_from(table)
+        if (magic, version, totals, ups, pairs) != (_MAGIC, _VERSION, MAX_TOTAL + 1, UP_CARDS, PAIR_VALUES) \
+                or len(table) != _FILE_SIZE:
+            raise ValueError("Invalid blackjack strategy file.")
+        self.table = table
+
+    @classmethod
+    def open(cls, path):
+        """ファイルをmmapで開く"""
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def action(self, total, soft, up):
+        """'hit' または 'stand'"""
+        if total > MAX_TOTAL:
+            return ACTION_NAMES[STAND]
+        index = _HEADER.size + (total * 2 + soft) * UP_CARDS + up - 1
+        return ACTION_NAMES[self.table[index]]
+
+    def split(self, value, up):
+        """ペアをスプリットすべきか"""
+        return bool(self.table[_HEADER.size + _ACTION_SIZE + (value - 1) * UP_CARDS + up - 1])
+
+    def hint(self, hand, up, split_available=False):
+        """手札(Hand)とディーラーのアップカードの点数から推奨アクション"""
+        if split_available and self.split(CARD_VALUE[hand.cards[0]], up):
+            return 'split'
+        return self.action(hand.score, hand.soft, up)
+
+
+_strategy = None
+
+
+def load_strategy(path):
+    """起動時に判断表を読み込む（ファイルがなければヒントなし）"""
+    global _strategy
+    try:
+        _strategy = Strategy.open(path)
+    except (FileNotFoundError, ValueError):
+        _strategy = None
+    return _strategy
+
+
+def get_strategy():
+    """読み込み済みの判断表（なければNone）"""
+    return _strategy
@@ -0,0 +1,346 @@
+"""WebSocketで共有するテーブル
+
+テーブルには複数のプレイヤーが接続し、ベットやアクションを1メッセージで送る。
+配られたカードや精算の結果はテーブルの全員に送られる。
+
+メッセージの処理（ゲームエンジン・DB）は同期処理なので、
+テーブルごとのロックを取ったうえで sync_to_async でスレッドに渡す。
+"""
+import abc
+import asyncio
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from .bacarrat import Baccarat
+from .blackjack import Blackjack
+from .engine import BaccaratEngine, BlackjackEngine, BlackjackRound, Hand
+from .roadmap import Roadmap
+from .shoe import Shoe
+
+
+class TableError(Exception):
+    """クライアントに返すエラー"""
+
+
+class Connection:
+    """テーブルに接続している1人のプレイヤー"""
+
+    def __init__(self, user, send):
+        self.user = user
+        self._send = send
+
+    async def send(self, message):
+        """JSONのメッセージを送る"""
+        await self._send({
+            'type': 'websocket.send',
+            'text': json.dumps(message, separators=(',', ':')),
+        })
+
+
+def parse_amount(message, user):
+    """ベット額を取り出し、最新の所持金で確認"""
+    try:
+        amount = int(message.get('amount', 0))
+    except (TypeError, ValueError):
+        raise TableError('invalid amount')
+    user.refresh_from_db(fields=['money'])
+    if amount <= 0 or amount > user.money:
+        raise TableError('invalid amount')
+    return amount
+
+
+class Table(abc.ABC):
+    """テーブルの共通部分（接続の管理と送信）"""
+
+    game = None
+
+    def __init__(self, name):
+        self.name = name
+        self.connections = set()
+        self.lock = asyncio.Lock()
+
+    @property
+    def players(self):
+        return sorted({connection.user.username for connection in self.connections})
+
+    async def broadcast(self, message):
+        """テーブルの全員に送る"""
+        await asyncio.gather(*(connection.send(message) for connection in list(self.connections)))
+
+    async def join(self, connection):
+        self.connections.add(connection)
+        await connection.send(self.snapshot(connection))
+        await self.broadcast({'type': 'joined', 'player': connection.user.username, 'players': self.players})
+
+    async def leave(self, connection):
+        self.connections.discard(connection)
+        async with self.lock:
+            broadcasts = await sync_to_async(self.disconnected)(connection)
+        for broadcast in broadcasts or ():
+            await self.broadcast(broadcast)
+        await self.broadcast({'type': 'left', 'player': connection.user.username, 'players': self.players})
+
+    async def receive(self, connection, message):
+        """1メッセージを処理し、送るメッセージを配る"""
+        async with self.lock:
+            try:
+                replies, broadcasts = await sync_to_async(self.handle)(connection, message)
+            except TableError as exc:
+                await connection.send({'type': 'error', 'error': str(exc)})
+                return
+        for reply in replies:
+            await connection.send(reply)
+        for broadcast in broadcasts:
+            await self.broadcast(broadcast)
+
+    def snapshot(self, connection):
+        """接続したプレイヤーに送るテーブルの状態"""
+        return {
+            'type': 'table',
+            'game': self.game,
+            'table': self.name,
+            'you': connection.user.username,
+            'players': self.players,
+        }
+
+    @abc.abstractmethod
+    def handle(self, connection, message):
+        """メッセージを処理し、(本人への返信, 全員への送信) を返す"""
+
+    def disconnected(self, connection):
+        """切断したプレイヤーの後始末（全員に送るメッセージを返す）"""
+
+
+class BaccaratTable(Table):
+    """バカラのテーブル（山札と罫線をテーブルの全員で共有）
+
+    最初のベットから BETTING_SECONDS の間ベットを受け付け、締め切ったら1回だけ配って
+    席に着いた全員のベットをまとめて精算する（配る処理と所持金の更新はテーブルごとに1回）。
+    """
+
+    game = 'baccarat'
+
+    # 席の数とベットの受付時間（settings.BACCARAT_TABLE で変更できる）
+    SEATS = 7
+    BETTING_SECONDS = 15.0
+
+    def __init__(self, name):
+        super().__init__(name)
+        config = getattr(settings, 'BACCARAT_TABLE', {})
+        self.seat_count = config.get('SEATS', self.SEATS)
+        self.betting_seconds = config.get('BETTING_SECONDS', self.BETTING_SECONDS)
+        self.shoe = Shoe(Baccarat.SHOE_DECKS, Baccarat.SHOE_PENETRATION)
+        self.engine = BaccaratEngine(self.shoe)
+        self.roadmap = Roadmap()
+        # 席番号 -> user_id
+        self.seats = [None] * self.seat_count
+        # user_id -> (connection, bet_type, amount)
+        self.bets = {}
+        # ベットの締め切り（time.monotonic()）と締め切りのタスク
+        self.closes_at = None
+        self.timer = None
+
+    def snapshot(self, connection):
+        snapshot = super().snapshot(connection)
+        snapshot.update(self.betting_state())
+        snapshot['results'] = self.roadmap.bead_plate
+        return snapshot
+
+    def betting_state(self):
+        """席・ベット・締め切りまでの秒数"""
+        names = {connection.user.pk: connection.user.username for connection in self.connections}
+        return {
+            'seats': [names.get(user_id) for user_id in self.seats],
+            'bets': [
+                {'player': connection.user.username, 'bet_type': bet_type, 'amount': amount}
+                for connection, bet_type, amount in self.bets.values()
+            ],
+            'closes_in': None if self.closes_at is None else max(round(self.closes_at - time.monotonic(), 1), 0),
+        }
+
+    def take_seat(self, user):
+        """空いている席に着く（着いていればそのまま）"""
+        if user.pk in self.seats:
+            return
+        try:
+            self.seats[self.seats.index(None)] = user.pk
+        except ValueError:
+            raise TableError('table full')
+
+    async def receive(self, connection, message):
+        await super().receive(connection, message)
+        if self.closes_at is not None and self.timer is None:
+            self.timer = asyncio.create_task(self.close_betting(self.closes_at - time.monotonic()))
+
+    async def close_betting(self, delay):
+        """締め切りまで待ってから配る"""
+        await asyncio.sleep(delay)
+        async with self.lock:
+            self.closes_at = self.timer = None
+            broadcasts = await sync_to_async(self.deal)() if self.bets else []
+        for broadcast in broadcasts:
+            await self.broadcast(broadcast)
+
+    def handle(self, connection, message):
+        if message.get('type') != 'bet':
+            raise TableError('unknown message')
+        bet_type = message.get('bet_type')
+        if bet_type not in BaccaratEngine.BET_TYPES:
+            raise TableError('invalid bet_type')
+        amount = parse_amount(message, connection.user)
+        self.take_seat(connection.user)
+        self.bets[connection.user.pk] = (connection, bet_type, amount)
+        if self.closes_at is None:
+            self.closes_at = time.monotonic() + self.betting_seconds
+        return [], [dict(self.betting_state(), type='bets')]
+
+    def deal(self):
+        """1ラウンド配り、全員のベットをまとめて精算"""
+        if self.shoe.needs_shuffle:
+            self.roadmap.reset()
+        state = self.engine.deal(0, None)
+        self.engine.apply(state, 'draw')
+        self.roadmap.add(state.winner)
+
+        bets = list(self.bets.values())
+        self.bets = {}
+        payouts = [
+            (connection.user, BaccaratEngine.calculate_payout(state.winner, bet_type, amount))
+            for connection, bet_type, amount in bets
+        ]
+        Baccarat.record_table_settlement(state, payouts)
+        return [{
+            'type': 'deal',
+            'player_cards': state.player_cards,
+            'banker_cards': state.banker_cards,
+            'player_score': state.player_score,
+            'banker_score': state.banker_score,
+            'winner': state.winner,
+            'settlements': [
+                {'player': user.username, 'payout': payout, 'money': user.money}
+                for user, payout in payouts
+            ],
+        }]
+
+    def disconnected(self, connection):
+        # 配る前に抜けたプレイヤーのベットは取り消し、他のタブも残っていなければ席を空ける
+        user_id = connection.user.pk
+        bet = self.bets.get(user_id)
+        if bet is not None and bet[0] is connection:
+            del self.bets[user_id]
+        if user_id in self.seats and not any(other.user.pk == user_id for other in self.connections):
+            self.seats[self.seats.index(user_id)] = None
+        if not self.connections and self.timer is not None:
+            self.timer.cancel()
+            self.closes_at = self.timer = None
+
+
+class BlackjackTable(Table):
+    """ブラックジャックのテーブル（各プレイヤーは自分の山札・ラウンドでディーラーと勝負）
+
+    'deal' でベットして配り、'action' でアクションを送ると差分が返る。
+    決着はテーブルの全員に送られる。
+    """
+
+    game = 'blackjack'
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.view = Blackjack()
+        # 接続 -> 山札（共有すると、配るときのシャッフルで他のプレイヤーのラウンドの途中の山札が混ざる）
+        self.shoes = {}
+        # 接続 -> 進行中のラウンド
+        self.rounds = {}
+
+    def engine(self, connection):
+        """接続の山札で配るエンジン"""
+        shoe = self.shoes.get(connection)
+        if shoe is None:
+            shoe = self.shoes[connection] = Shoe(Blackjack.SHOE_DECKS, Blackjack.SHOE_PENETRATION)
+        return BlackjackEngine(shoe)
+
+    def handle(self, connection, message):
+        kind = message.get('type')
+        user = connection.user
+        state = self.rounds.get(connection)
+        if kind == 'deal':
+            if state is not None and not state.game_over:
+                raise TableError('round in progress')
+            amount = parse_amount(message, user)
+            state = self.engine(connection).deal(amount, user.money)
+            self.rounds[connection] = state
+            return self.respond(connection, BlackjackRound(Hand(), Hand(), amount, user.money), state)
+        if kind == 'action':
+            action = message.get('action')
+            if state is None or action not in BlackjackEngine.ACTIONS:
+                raise TableError('invalid action')
+            before = BlackjackRound.loads(state.dumps())
+            hand_index = message.get('hand_index')
+            if not self.engine(connection).apply(state, action, hand_index if isinstance(hand_index, int) else None):
+                raise TableError('action not allowed')
+            return self.respond(connection, before, state)
+        raise TableError('unknown message')
+
+    def respond(self, connection, before, state):
+        """本人への差分と、決着したら全員への結果"""
+        user = connection.user
+        payout = state.pending_payout
+        if payout is not None:
+            # 所持金の記録がコミットされてから精算済みにする
+            Blackjack.record_settlement(user, state, payout)
+            BlackjackEngine.settle(state)
+        reply = self.view.get_delta(before, state, user.money)
+        reply['type'] = 'delta'
+        reply['dealer_up'] = state.dealer.cards[0]
+        broadcasts = []
+        if state.game_over:
+            del self.rounds[connection]
+            broadcasts.append({'type': 'result', 'player': user.username, 'winner': state.winner, 'payout': state.payout})
+        return [reply], broadcasts
+
+    def disconnected(self, connection):
+        # 途中で抜けたラウンドはスタンドして精算する（負けそうなハンドを切断で逃げられないように）
+        shoe = self.shoes.pop(connection, None)
+        state = self.rounds.get(connection)
+        if state is None:
+            return []
+        engine = BlackjackEngine(shoe)
+        while not state.game_over:
+            if state.split_prompt:
+                engine.apply(state, 'split_no')
+            elif state.split_active:
+                index = next(i for i, hand in enumerate(state.split_hands) if hand.status == 'playing')
+                engine.apply(state, 'split_stand', index)
+            else:
+                engine.apply(state, 'stand')
+        return self.respond(connection, state, state)[1]
+
+
+GAMES = {
+    'baccarat': BaccaratTable,
+    'blackjack': BlackjackTable,
+}
+
+
+class TableHub:
+    """プロセス内のテーブルの一覧"""
+
+    def __init__(self):
+        self.tables = {}
+
+    def get(self, game, name):
+        """テーブルを取得（なければ作成）"""
+        key = (game, name)
+        table = self.tables.get(key)
+        if table is None:
+            table = self.tables[key] = GAMES[game](name)
+        return table
+
+    def discard_empty(self, table):
+        """誰もいなくなったテーブルを片付ける"""
+        if not table.connections:
+            self.tables.pop((table.game, table.name), None)
+
+
+hub = TableHub()
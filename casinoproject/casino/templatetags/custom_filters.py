@@ -1,11 +1,66 @@
+from functools import lru_cache
 from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, json_script
+from ..card_atlas import BLANK_IMAGE, NAME as ATLAS_NAME, load_atlas
+from ..trump import CARD_NAME, CARD_IMAGE, CARD_SUIT, CARD_RANK
 
 register = template.Library()
 
 @register.filter
-def index(indexable, i):
-    """リストのインデックスアクセス"""
-    try:
-        return indexable[int(i)]
-    except (IndexError, TypeError, ValueError):
-        return None
\ No newline at end of file
+def card_names(cards):
+    """カード番号のバイト列をカード名の文字列に変換"""
+    return ' '.join(CARD_NAME[card] for card in bytes(cards))
+
+@register.filter
+def card_img(card):
+    """カードの<img>タグ（52枚分を最初に1度だけ組み立てる）"""
+    return _card_img_tags()[card['name']]
+
+@lru_cache(maxsize=None)
+def _card_img_tags():
+    if load_atlas() is not None:
+        # スプライトがあれば1枚の画像の一部を表示
+        return {
+            name: format_html(
+                '<img class="card-sprite c-{}" src="{}" alt="{} {}">', card, BLANK_IMAGE, suit, rank)
+            for card, (name, suit, rank) in enumerate(zip(CARD_NAME, CARD_SUIT, CARD_RANK))
+        }
+    return {
+        name: format_html('<img src="{}" alt="{} {}">', static(f'card_images/{image}'), suit, rank)
+        for name, image, suit, rank in zip(CARD_NAME, CARD_IMAGE, CARD_SUIT, CARD_RANK)
+    }
+
+@register.simple_tag
+def card_back_img():
+    """伏せたカードの<img>タグ"""
+    if load_atlas() is not None:
+        return format_html('<img class="card-sprite back" src="{}" alt="Hidden Card">', BLANK_IMAGE)
+    return format_html(
+        '<img src="{}" alt="Hidden Card" style="width: 320px; margin: -80px;">', static('card_images/card_back.png'))
+
+@register.simple_tag
+def card_atlas_css():
+    """スプライトのCSSの<link>タグ（スプライトがなければ空）"""
+    if load_atlas() is None:
+        return ''
+    return format_html('<link rel="stylesheet" href="{}">', static(f'casino/cards/{ATLAS_NAME}.css'))
+
+@register.simple_tag
+def card_images_script():
+    """カード番号から画像のURLを引くためのJSON（ブラックジャックの差分更新用）"""
+    return _card_images_script()
+
+@lru_cache(maxsize=None)
+def _card_images_script():
+    if load_atlas() is not None:
+        images = [
+            {'src': BLANK_IMAGE, 'sprite': f'card-sprite c-{card}', 'alt': f'{suit} {rank}'}
+            for card, (suit, rank) in enumerate(zip(CARD_SUIT, CARD_RANK))
+        ]
+        return json_script(images, 'card-images')
+    images = [
+        {'src': static(f'card_images/{image}'), 'alt': f'{suit} {rank}'}
+        for image, suit, rank in zip(CARD_IMAGE, CARD_SUIT, CARD_RANK)
+    ]
+    return json_script(images, 'card-images')
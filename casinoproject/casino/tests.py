@@ -1,3 +1,566 @@
-from django.test import TestCase
+import base64
+import json
+import socket
+import socketserver
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from unittest import mock
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.db import OperationalError
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from accounts.models import CustomUser
+from . import wallet
+from .blackjack import Blackjack
+from .engine import BaccaratEngine, BaccaratRound, BlackjackEngine, BlackjackRound, Hand, SplitHand
+from .history import HistoryWriter
+from .models import GameHistory, WalletEntry
+from .paging import decode_cursor, encode_cursor
+from .roadmap import Roadmap
+from .roadmap_fragment import fragment_key, render_roadmap
+from .state_store import LocalStateStore, RedisStateStore, StateStoreError
+from .shoe import Shoe
+from .tables import BlackjackTable, Connection, hub
+from .websocket import CLOSE_UNAUTHORIZED, websocket_application
 
-# Create your tests here.
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    """テスト用のRedis互換サーバー（GET / SET / DEL / EXPIRE だけ）
+
+    fail_next に入れたエラーを次のコマンドの応答として返し、
+    drop_next をTrueにすると次のコマンドで応答せずに接続を切る。
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.data = {}
+        self.expires = {}
+        self.commands = []
+        self.connections = 0
+        self.fail_next = None
+        self.drop_next = False
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def location(self):
+        host, port = self.server_address
+        return 'redis://%s:%d/0' % (host, port)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+    def execute(self, args):
+        """コマンドを実行してRESPの応答を返す"""
+        command, *args = args
+        command = command.upper()
+        self.commands.append([command, *args])
+        if command == b'GET':
+            value = self.data.get(args[0])
+            return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+        if command == b'SET':
+            self.data[args[0]] = args[1]
+            self.expires.pop(args[0], None)
+            if len(args) == 4 and args[2].upper() == b'EX':
+                self.expires[args[0]] = int(args[3])
+            return b'+OK\r\n'
+        if command == b'DEL':
+            self.expires.pop(args[0], None)
+            return b':%d\r\n' % (self.data.pop(args[0], None) is not None)
+        if command == b'EXPIRE':
+            if args[0] not in self.data:
+                return b':0\r\n'
+            self.expires[args[0]] = int(args[1])
+            return b':1\r\n'
+        return b"-ERR unknown command '%s'\r\n" % command
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        self.server.connections += 1
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            args = []
+            for _ in range(int(line[1:-2])):
+                length = int(self.rfile.readline()[1:-2])
+                args.append(self.rfile.read(length + 2)[:-2])
+            if self.server.drop_next:
+                self.server.drop_next = False
+                return
+            if self.server.fail_next:
+                reply, self.server.fail_next = b'-%s\r\n' % self.server.fail_next, None
+            else:
+                reply = self.server.execute(args)
+            self.wfile.write(reply)
+
+
+class RedisStateStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        self.server = FakeRedisServer().__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.store = RedisStateStore(self.server.location, timeout=60)
+        self.addCleanup(self.store.close)
+
+    def test_encode(self):
+        self.assertEqual(
+            RedisStateStore._encode(('SET', 'casino:k', 'é', 'EX', 60)),
+            b'*5\r\n$3\r\nSET\r\n$8\r\ncasino:k\r\n$2\r\n\xc3\xa9\r\n$2\r\nEX\r\n$2\r\n60\r\n',
+        )
+
+    def test_set_get_delete(self):
+        self.store.set('blackjack_round:1', 'state')
+        self.assertEqual(self.server.data, {b'casino:blackjack_round:1': b'state'})
+        self.assertEqual(self.server.expires, {b'casino:blackjack_round:1': 60})
+        self.assertEqual(self.store.get('blackjack_round:1'), 'state')
+        self.store.delete('blackjack_round:1')
+        self.assertIsNone(self.store.get('blackjack_round:1'))
+
+    def test_set_without_timeout(self):
+        store = RedisStateStore(self.server.location)
+        self.addCleanup(store.close)
+        store.set('key', 'value')
+        self.assertEqual(self.server.commands[-1], [b'SET', b'casino:key', b'value'])
+
+    def test_integer_reply(self):
+        self.store.set('key', 'value')
+        self.assertEqual(self.store.command('EXPIRE', 'casino:key', 5), 1)
+        self.assertEqual(self.server.expires[b'casino:key'], 5)
+
+    def test_error_reply(self):
+        self.server.fail_next = b'ERR out of memory'
+        with self.assertRaisesMessage(StateStoreError, 'ERR out of memory'):
+            self.store.set('key', 'value')
+        # エラーの後は繋ぎ直す
+        self.store.set('key', 'value')
+        self.assertEqual(self.store.get('key'), 'value')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_reconnect_after_connection_closed(self):
+        self.store.set('key', 'value')
+        self.server.drop_next = True
+        with self.assertRaises(StateStoreError):
+            self.store.get('key')
+        self.assertEqual(self.store.get('key'), 'value')
+        self.assertEqual(self.server.connections, 2)
+
+    def test_server_unavailable(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        store = RedisStateStore('redis://127.0.0.1:%d/0' % port)
+        with self.assertRaises(StateStoreError):
+            store.get('key')
+
+
+class LocalStateStoreTests(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        store = LocalStateStore(max_entries=2)
+        store.set('a', '1')
+        store.set('b', '2')
+        store.get('a')
+        store.set('c', '3')
+        self.assertEqual((store.get('a'), store.get('b'), store.get('c')), ('1', None, '3'))
+
+    def test_expires(self):
+        store = LocalStateStore(timeout=0.01)
+        store.set('a', '1')
+        time.sleep(0.02)
+        self.assertIsNone(store.get('a'))
+        self.assertEqual(len(store), 0)
+
+
+class RoadmapTests(SimpleTestCase):
+
+    def test_dumps_loads(self):
+        roadmap = Roadmap()
+        for winner in ['draw', 'banker', 'banker', 'player', 'draw', 'player', 'banker']:
+            roadmap.add(winner)
+        restored = Roadmap.loads(roadmap.dumps())
+        self.assertEqual(restored.generation, roadmap.generation)
+        self.assertEqual(restored.serial, roadmap.serial)
+        self.assertEqual(restored.big_road_columns, roadmap.big_road_columns)
+        self.assertEqual(restored.derived_columns, roadmap.derived_columns)
+
+    def test_fragment_key_changes_when_recreated(self):
+        user = CustomUser(pk=1)
+        roadmap = Roadmap()
+        roadmap.add('player')
+        # 罫線が消えて作り直されると、同じserialでもキーが変わる
+        recreated = Roadmap()
+        recreated.add('banker')
+        self.assertEqual(roadmap.serial, recreated.serial)
+        self.assertNotEqual(fragment_key(user, roadmap), fragment_key(user, recreated))
+
+        key = fragment_key(user, roadmap)
+        roadmap.reset()
+        self.assertNotEqual(fragment_key(user, roadmap), key)
+
+    def test_derived_road_labels(self):
+        roadmap = Roadmap()
+        for winner in ['player', 'banker', 'player', 'player', 'banker', 'player']:
+            roadmap.add(winner)
+        html = render_roadmap(roadmap)
+        self.assertIn('>Big Eye Boy<', html)
+        self.assertNotIn('big_eye_boy', html)
+
+
+def stacked_shoe(cards):
+    """指定した順にカードを配る山札"""
+    shoe = Shoe()
+    shoe.cards = array('B', cards)
+    shoe.position = 0
+    shoe.cut_card = len(cards)
+    return shoe
+
+
+class BlackjackEngineTests(SimpleTestCase):
+
+    def test_natural_blackjack(self):
+        # プレイヤー A・10、ディーラー 5・6 から7を引いて18
+        engine = BlackjackEngine(stacked_shoe([0, 4, 9, 5, 6]))
+        state = engine.deal(100, 1000)
+        self.assertTrue(state.game_over)
+        self.assertEqual((state.winner, state.payout), ('blackjack', 150))
+        self.assertEqual(state.dealer.score, 18)
+        self.assertFalse(engine.apply(state, 'hit'))
+
+    def test_split(self):
+        # 8のペアをスプリット、ディーラーは 10・7 の17
+        engine = BlackjackEngine(stacked_shoe([9, 6, 22, 2, 12]))
+        state = engine.deal(100, 1000, player_cards=[7, 20])
+        self.assertTrue(state.split_prompt)
+        self.assertTrue(engine.apply(state, 'split_yes'))
+        self.assertEqual([hand.score for hand in state.split_hands], [18, 11])
+        self.assertFalse(engine.apply(state, 'split_hit', 2))
+        self.assertTrue(engine.apply(state, 'split_hit', 1))
+        self.assertEqual(state.split_hands[1].status, 'standing')
+        self.assertFalse(state.game_over)
+        self.assertTrue(engine.apply(state, 'split_stand', 0))
+        self.assertTrue(state.game_over)
+        self.assertEqual([hand.result for hand in state.split_hands], ['player', 'player'])
+        self.assertEqual((state.winner, state.payout), ('split', 200))
+
+    def test_split_needs_money_for_second_bet(self):
+        engine = BlackjackEngine(stacked_shoe([9, 6]))
+        state = engine.deal(100, 150, player_cards=[7, 20])
+        self.assertFalse(state.split_available)
+        self.assertFalse(engine.apply(state, 'split_yes'))
+
+    def test_bust(self):
+        engine = BlackjackEngine(stacked_shoe([4, 5, 12, 35]))
+        state = engine.deal(100, 1000, player_cards=[9, 22])
+        self.assertTrue(engine.apply(state, 'hit'))
+        self.assertEqual(state.player.score, 30)
+        self.assertTrue(state.game_over)
+        self.assertEqual((state.winner, state.payout), ('dealer', -100))
+
+    def test_judge(self):
+        self.assertEqual(BlackjackEngine.judge(22, 23, 3, 100), ('dealer', -100))
+        self.assertEqual(BlackjackEngine.judge(21, 20, 2, 100), ('blackjack', 150))
+        self.assertEqual(BlackjackEngine.judge(21, 20, 3, 100), ('player', 100))
+        self.assertEqual(BlackjackEngine.judge(18, 18, 2, 100), ('draw', 0))
+
+    def test_settle_once(self):
+        engine = BlackjackEngine(stacked_shoe([9, 22, 4, 5, 12]))
+        state = engine.deal(100, 1000)
+        self.assertIsNone(engine.settle(state))
+        engine.apply(state, 'stand')
+        self.assertEqual(engine.settle(state), 100)
+        self.assertTrue(state.settled)
+        self.assertIsNone(engine.settle(state))
+
+
+class BaccaratEngineTests(SimpleTestCase):
+
+    def test_third_card_rule(self):
+        cases = [
+            # (プレイヤー, バンカー, プレイヤーの3枚目), (プレイヤーが引く, バンカーが引く)
+            ((8, 3, None), (False, False)),
+            ((3, 9, None), (False, False)),
+            ((6, 5, None), (False, True)),
+            ((7, 6, None), (False, False)),
+            ((5, 7, None), (True, False)),
+            ((0, 2, 8), (True, True)),
+            ((0, 3, 8), (True, False)),
+            ((0, 3, 9), (True, True)),
+            ((0, 4, 1), (True, False)),
+            ((0, 4, 2), (True, True)),
+            ((0, 5, 3), (True, False)),
+            ((0, 5, 4), (True, True)),
+            ((0, 6, 5), (True, False)),
+            ((0, 6, 6), (True, True)),
+        ]
+        for args, expected in cases:
+            self.assertEqual(BaccaratEngine.should_draw_third_card(*args), expected, args)
+
+    def test_calculate_payout(self):
+        self.assertEqual(BaccaratEngine.calculate_payout('draw', 'draw', 100), 800)
+        self.assertEqual(BaccaratEngine.calculate_payout('banker', 'banker', 100), 100)
+        self.assertEqual(BaccaratEngine.calculate_payout('draw', 'player', 100), -100)
+        self.assertEqual(BaccaratEngine.calculate_payout('player', 'banker', 100), -100)
+
+    def test_third_card_and_settle_once(self):
+        # プレイヤー 2・3 の5、バンカー 10・K の0 はどちらも3枚目を引く
+        engine = BaccaratEngine(stacked_shoe([1, 2, 9, 12, 3, 5]))
+        state = engine.deal(100, 'player')
+        self.assertTrue(state.need_third_card)
+        self.assertIsNone(engine.settle(state))
+        self.assertTrue(engine.apply(state, 'draw'))
+        self.assertEqual((state.player_score, state.banker_score), (9, 6))
+        self.assertEqual((state.winner, state.payout), ('player', 100))
+        self.assertFalse(engine.apply(state, 'draw'))
+        self.assertEqual(engine.settle(state), 100)
+        self.assertIsNone(engine.settle(state))
+
+
+def with_version(data, version):
+    """保存形式の先頭（バージョン）を書き換える"""
+    raw = bytearray(base64.b64decode(data))
+    raw[0] = version
+    return base64.b64encode(raw).decode('ascii')
+
+
+class RoundStateTests(SimpleTestCase):
+
+    def test_blackjack_round_trip(self):
+        state = BlackjackRound(Hand([7, 20]), Hand([9, 6]), 100, 1000, round_id=2**62 + 1)
+        state.split_hands = [SplitHand([7, 22], 'standing', 'player'), SplitHand([20, 2, 12], 'bust', 'dealer')]
+        state.split_active = True
+        state.split_complete = True
+        state.game_over = True
+        state.winner = 'split'
+        state.payout = 0
+        restored = BlackjackRound.loads(state.dumps())
+        for name in BlackjackRound.__slots__:
+            if name in ('player', 'dealer', 'split_hands'):
+                continue
+            self.assertEqual(getattr(restored, name), getattr(state, name), name)
+        self.assertEqual((restored.player.cards, restored.dealer.cards), ([7, 20], [9, 6]))
+        self.assertEqual(
+            [(hand.cards, hand.status, hand.result) for hand in restored.split_hands],
+            [([7, 22], 'standing', 'player'), ([20, 2, 12], 'bust', 'dealer')])
+        self.assertEqual(restored.pending_payout, 0)
+
+    def test_baccarat_round_trip(self):
+        state = BaccaratRound([1, 2, 3], [9, 12, 5], 100, 'player', round_id=12345)
+        BaccaratEngine.finish_round(state)
+        BaccaratEngine.settle(state)
+        restored = BaccaratRound.loads(state.dumps())
+        for name in BaccaratRound.__slots__:
+            self.assertEqual(getattr(restored, name), getattr(state, name), name)
+
+    def test_unknown_version(self):
+        blackjack = BlackjackRound(Hand([0, 9]), Hand([1, 2]), 100, 1000).dumps()
+        baccarat = BaccaratRound([1, 2], [9, 12], 100, 'banker').dumps()
+        for version in (1, 3):
+            self.assertIsNone(BlackjackRound.loads(with_version(blackjack, version)))
+            self.assertIsNone(BaccaratRound.loads(with_version(baccarat, version)))
+
+
+class SettlementTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('casino.history._writer', HistoryWriter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create_user('player', password='password')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def finished_round(self, payout):
+        state = BlackjackRound(Hand([0, 9]), Hand([1, 2]), abs(payout), self.user.money)
+        state.game_over = True
+        state.winner = 'player' if payout > 0 else 'dealer'
+        state.payout = payout
+        return state
+
+    def test_apply_once_per_round(self):
+        self.assertEqual(wallet.apply(self.user, 100, 'blackjack', 1), 1100)
+        self.assertEqual(wallet.apply(self.user, 100, 'blackjack', 1), 1100)
+        self.assertEqual(wallet.apply_many([(self.user.pk, -50, 'baccarat', 2)]), {self.user.pk: 1050})
+        self.assertEqual(wallet.apply_many([(self.user.pk, -50, 'baccarat', 2)]), {self.user.pk: 1050})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money, 1050)
+        self.assertEqual(WalletEntry.objects.filter(user=self.user).count(), 2)
+
+    def test_failed_settlement_is_retried(self):
+        view = Blackjack()
+        with mock.patch('casino.wallet._apply', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError):
+                view.finish_round(self.request, self.finished_round(100))
+        # 所持金に反映されるまでは未精算のまま
+        stored = view.load_round(self.request)
+        self.assertFalse(stored.settled)
+
+        view.finish_round(self.request, stored)
+        view.finish_round(self.request, view.load_round(self.request))
+        self.assertTrue(view.load_round(self.request).settled)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.money, 1100)
+        self.assertEqual(WalletEntry.objects.get(user=self.user).round_id, stored.round_id)
+
+
+class CursorTests(SimpleTestCase):
+
+    def test_round_trip(self):
+        played_at = datetime(2026, 10, 18, 12, 30, 15, 123456, tzinfo=timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(played_at, 42)), (played_at, 42))
+
+    def test_invalid_cursor(self):
+        # 壊れたbase64・長さが違う・範囲外の時刻
+        for cursor in ['!!!', 'QUJD', 'QAAAAAAAAAAAAAAAAAAAAQ']:
+            self.assertIsNone(decode_cursor(cursor), cursor)
+
+
+class BlackjackTableTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch('casino.history._writer', HistoryWriter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_players_deal_from_their_own_shoes(self):
+        table = BlackjackTable('shoes')
+        alice = Connection(CustomUser.objects.create_user('alice'), None)
+        bob = Connection(CustomUser.objects.create_user('bob'), None)
+        table.handle(alice, {'type': 'deal', 'amount': 10})
+        shoe = table.shoes[alice]
+        position, cards = shoe.position, shoe.cards.tobytes()
+
+        # 他のプレイヤーの山札がカットカードに届いて配るときにシャッフルしても、ラウンドの途中の山札は変わらない
+        table.shoes[bob] = Shoe(Blackjack.SHOE_DECKS, Blackjack.SHOE_PENETRATION)
+        table.shoes[bob].position = table.shoes[bob].cut_card
+        table.handle(bob, {'type': 'deal', 'amount': 10})
+        self.assertLess(table.shoes[bob].position, 10)
+        self.assertEqual((shoe.position, shoe.cards.tobytes()), (position, cards))
+
+        table.connections.add(bob)
+        table.disconnected(alice)
+        self.assertNotIn(alice, table.shoes)
+        self.assertNotIn(alice, table.rounds)
+
+
+class TableClient:
+    """テスト用のWebSocketクライアント（ASGIアプリをプロセス内で呼ぶ）"""
+
+    def __init__(self, path, session_key):
+        self.communicator = ApplicationCommunicator(websocket_application, {
+            'type': 'websocket',
+            'path': path,
+            'headers': [
+                (b'host', b'testserver'),
+                (b'cookie', ('%s=%s' % (settings.SESSION_COOKIE_NAME, session_key)).encode()),
+            ],
+        })
+
+    async def connect(self):
+        await self.communicator.send_input({'type': 'websocket.connect'})
+        return await self.communicator.receive_output(5)
+
+    async def send(self, message):
+        await self.communicator.send_input({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def receive(self):
+        event = await self.communicator.receive_output(5)
+        return json.loads(event['text'])
+
+    async def receive_type(self, kind):
+        """指定した種類のメッセージが来るまで読む"""
+        while True:
+            message = await self.receive()
+            if message['type'] == kind:
+                return message
+
+    async def disconnect(self):
+        await self.communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await self.communicator.wait(5)
+
+
+@override_settings(BACCARAT_TABLE={'SEATS': 7, 'BETTING_SECONDS': 0.05})
+class BaccaratTableTests(TestCase):
+
+    def setUp(self):
+        # テストではスプールもバックグラウンドのスレッドも使わない
+        self.writer = HistoryWriter()
+        patcher = mock.patch('casino.history._writer', self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.alice, self.alice_session = self.login('alice')
+        self.bob, self.bob_session = self.login('bob')
+
+    @staticmethod
+    def login(username):
+        user = CustomUser.objects.create_user(username, password='password')
+        client = Client()
+        client.force_login(user)
+        return user, client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    async def join(self, name, session_key):
+        client = TableClient('/ws/table/baccarat/%s/' % name, session_key)
+        self.assertEqual(await client.connect(), {'type': 'websocket.accept'})
+        self.assertEqual((await client.receive())['type'], 'table')
+        await client.receive_type('joined')
+        return client
+
+    async def test_rejects_anonymous(self):
+        client = TableClient('/ws/table/baccarat/anonymous/', 'invalid')
+        self.assertEqual(await client.connect(), {'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        self.assertNotIn(('baccarat', 'anonymous'), hub.tables)
+
+    async def test_bet_and_deal_are_broadcast(self):
+        alice = await self.join('deal', self.alice_session)
+        bob = await self.join('deal', self.bob_session)
+        await alice.receive_type('joined')
+
+        await alice.send({'type': 'bet', 'bet_type': 'banker', 'amount': 100})
+        for client in (alice, bob):
+            bets = await client.receive_type('bets')
+            self.assertEqual(bets['bets'], [{'player': 'alice', 'bet_type': 'banker', 'amount': 100}])
+            self.assertEqual(bets['seats'][0], 'alice')
+
+        deals = [await client.receive_type('deal') for client in (alice, bob)]
+        self.assertEqual(deals[0], deals[1])
+        [settlement] = deals[0]['settlements']
+        self.assertEqual(settlement['player'], 'alice')
+        self.assertEqual(settlement['money'], 1000 + settlement['payout'])
+
+        await alice.disconnect()
+        await bob.disconnect()
+        await self.alice.arefresh_from_db()
+        self.assertEqual(self.alice.money, settlement['money'])
+        self.assertEqual(len(self.writer.rows), 1)
+
+    async def test_leave_cleans_up(self):
+        alice = await self.join('leave', self.alice_session)
+        bob = await self.join('leave', self.bob_session)
+        await alice.receive_type('joined')
+        table = hub.tables[('baccarat', 'leave')]
+        # 抜けるまでに配らないよう締め切りを延ばす
+        table.betting_seconds = 60
+
+        await alice.send({'type': 'bet', 'bet_type': 'player', 'amount': 10})
+        await bob.receive_type('bets')
+        await alice.disconnect()
+        # 配る前に抜けたプレイヤーのベットは取り消し、席を空ける
+        self.assertEqual((await bob.receive_type('left'))['players'], ['bob'])
+        self.assertEqual(table.bets, {})
+        self.assertEqual(table.seats[0], None)
+
+        await bob.disconnect()
+        self.assertIsNone(table.timer)
+        self.assertNotIn(('baccarat', 'leave'), hub.tables)
+        self.assertEqual(await GameHistory.objects.acount(), 0)
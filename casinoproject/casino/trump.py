@@ -14,6 +14,11 @@ RANK_MAP = {
     13: 'K'
 }
 
+# カードの並び順（カード番号 = スート番号 * 13 + ランク - 1）
+SUITS = ('spade', 'heart', 'diamond', 'club')
+RANKS = tuple(range(1, 14))
+DECK_SIZE = len(SUITS) * len(RANKS)
+
 def get_card_image(suit, rank):
     """カードの画像ファイル名を取得"""
     suit_char = SUIT_MAP[suit]
@@ -23,13 +28,19 @@ def get_card_image(suit, rank):
         return f"{rank_char}{suit_char}_alt.png"
     return f"{rank_char}{suit_char}.png"
 
+# カード番号(0-51)から各属性を引くためのテーブル
+CARD_SUIT = tuple(suit for suit in SUITS for rank in RANKS)
+CARD_RANK = bytes(rank for suit in SUITS for rank in RANKS)
+CARD_VALUE = bytes(min(rank, 10) for suit in SUITS for rank in RANKS)  # A=1, 10/J/Q/K=10
+CARD_NAME = tuple(f"{suit}{rank}" for suit in SUITS for rank in RANKS)
+CARD_IMAGE = tuple(get_card_image(suit, rank) for suit in SUITS for rank in RANKS)
+
 TRUMP = [
     {
-        'suit': suit, 
-        'rank': rank, 
-        'name': f"{suit}{rank}",
-        'image': get_card_image(suit, rank)
-    } 
-    for suit in ['spade', 'heart', 'diamond', 'club'] 
-    for rank in range(1, 14)
-]
\ No newline at end of file
+        'suit': CARD_SUIT[card],
+        'rank': CARD_RANK[card],
+        'name': CARD_NAME[card],
+        'image': CARD_IMAGE[card]
+    }
+    for card in range(DECK_SIZE)
+]
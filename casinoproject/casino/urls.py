@@ -7,4 +7,7 @@ urlpatterns = [
     path('bacarrat/', views.bacarrat, name='bacarrat'),
     path('blackjack_bet/', views.blackjack_bet, name='blackjack_bet'),
     path('blackjack/', views.blackjack, name='blackjack'),
+    path('blackjack/action/', views.blackjack_action, name='blackjack_action'),
+    path('history/', views.history, name='history'),
+    path('table/<str:game>/<slug:table>/', views.table, name='table'),
 ]
\ No newline at end of file
@@ -1,13 +1,19 @@
 import random
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views import View
 from .trump import TRUMP
 from accounts.models import CustomUser
-from .models import GameHistory
+from .models import GameHistory, BlackjackHistory
 from .bacarrat import Baccarat
 from .blackjack import Blackjack
+from .history import get_history_writer
+from .paging import keyset_page
+from . import metrics as request_metrics
+from .tables import GAMES
 
 # Create your views here.
 @login_required
@@ -46,6 +52,12 @@ class BlackjackGameView(LoginRequiredMixin, Blackjack, View):
     def post(self, request):
         return self.play_game(request)
 
+class BlackjackActionView(LoginRequiredMixin, Blackjack, View):
+    """ブラックジャックのアクションAPI（差分をJSONで返す）"""
+
+    def post(self, request):
+        return self.play_action(request)
+
 class BlackjackBetView(LoginRequiredMixin, View):
     """ブラックジャックベットビュー"""
     
@@ -54,7 +66,7 @@ class BlackjackBetView(LoginRequiredMixin, View):
         player = request.user
         
         # 新しいゲームを開始するため、前回のゲーム結果をクリア
-        request.session['game_result_saved'] = False
+        Blackjack.clear_round(request)
         
         return render(request, 'casino/blackjack_bet.html', {'money': player.money})
     
@@ -66,10 +78,64 @@ class BlackjackBetView(LoginRequiredMixin, View):
         # セッションにベット情報を保存し、前回のゲーム結果をクリア
         request.session['bet_amount'] = bet_amount
         request.session['bet_type'] = bet_type
-        request.session['game_result_saved'] = False
+        Blackjack.clear_round(request)
         
         return redirect('blackjack')
 
 # 後方互換性のための関数ラッパー
 blackjack = BlackjackGameView.as_view()
-blackjack_bet = BlackjackBetView.as_view()
\ No newline at end of file
+blackjack_action = BlackjackActionView.as_view()
+blackjack_bet = BlackjackBetView.as_view()
+
+
+class HistoryView(LoginRequiredMixin, View):
+    """ゲーム履歴ビュー（新しい順、キーセットページング）"""
+
+    PAGE_SIZE = 50
+    MODELS = {
+        'baccarat': GameHistory,
+        'blackjack': BlackjackHistory,
+    }
+
+    def get(self, request):
+        game = request.GET.get('game', 'baccarat')
+        if game not in self.MODELS:
+            game = 'baccarat'
+
+        # このプロセスのバッファに残っている履歴を書き込んでから読む
+        # （他のワーカーのバッファの分は、それぞれのスレッドがFLUSH_INTERVAL秒以内に書き込む）
+        get_history_writer().flush()
+
+        queryset = self.MODELS[game].objects.filter(user=request.user)
+        histories, next_cursor = keyset_page(queryset, request.GET.get('cursor'), self.PAGE_SIZE)
+        return render(request, 'casino/history.html', {
+            'game': game,
+            'histories': histories,
+            'next_cursor': next_cursor,
+            'money': request.user.money,
+        })
+
+class TableView(LoginRequiredMixin, View):
+    """WebSocketで共有するテーブルのページ"""
+
+    def get(self, request, game, table):
+        if game not in GAMES:
+            raise Http404
+        return render(request, 'casino/table.html', {
+            'game': game,
+            'table': table,
+            'money': request.user.money,
+        })
+
+class MetricsView(View):
+    """処理時間の集計（Prometheusのテキスト形式）"""
+
+    def get(self, request):
+        allowed = getattr(settings, 'METRICS', {}).get('ALLOWED_IPS', [])
+        if request.META.get('REMOTE_ADDR') not in allowed:
+            raise Http404
+        return HttpResponse(request_metrics.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+history = HistoryView.as_view()
+table = TableView.as_view()
+metrics = MetricsView.as_view()
@@ -0,0 +1,159 @@
+"""所持金の更新
+
+CustomUser.money の読み込み→加算→save() ではなく、
+UPDATE ... SET money = money + %s の1文で加算するので、
+複数のタブやテーブルから同時に精算しても更新が失われない。
+加算と同じトランザクションで WalletEntry に増減を追記する。
+WalletEntry は (ユーザー, ラウンドID) で一意なので、同じラウンドの精算をやり直しても
+二度は加算されない（呼び出し元はコミットしてからラウンドを精算済みにする）。
+
+settings.WALLET_WRITE_QUEUE が有効なら、書き込みは1つのスレッド（WriteQueue）に渡し、
+そのとき溜まっている書き込みを1つのトランザクションでまとめてコミットする。
+SQLiteは同時に1つしか書き込めないので、各スレッドが書き込みロックを取り合うより速い。
+"""
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from accounts.models import CustomUser
+from .models import WalletEntry
+
+
+class WriteQueue:
+    """書き込みを1つのスレッドで順番に実行する"""
+
+    def __init__(self, batch_size=64):
+        self.batch_size = batch_size
+        self.jobs = queue.SimpleQueue()
+        self.thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        """funcを書き込みスレッドで実行し、終わるのを待って結果を返す"""
+        if threading.current_thread() is self.thread:
+            return func(*args)
+        future = Future()
+        self.jobs.put((future, func, args))
+        with self._lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='wallet-writer', daemon=True)
+                self.thread.start()
+        return future.result()
+
+    def _run(self):
+        while True:
+            batch = [self.jobs.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.jobs.get_nowait())
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        """溜まった書き込みを1つのトランザクションで実行（失敗した書き込みだけ取り消す）"""
+        outcomes = []
+        try:
+            with transaction.atomic():
+                for _, func, args in batch:
+                    try:
+                        with transaction.atomic():
+                            outcomes.append((func(*args), None))
+                    except Exception as exc:
+                        outcomes.append((None, exc))
+        except Exception as exc:
+            # コミットに失敗したら全部失敗
+            outcomes = [(None, exc)] * len(batch)
+            connection.close_if_unusable_or_obsolete()
+        for (future, _, _), (result, exc) in zip(batch, outcomes):
+            if exc is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exc)
+
+
+_write_queue = None
+
+
+def _submit(func, *args):
+    """settings.WALLET_WRITE_QUEUE が有効なら書き込みスレッドで、無効ならこのスレッドで実行"""
+    global _write_queue
+    config = getattr(settings, 'WALLET_WRITE_QUEUE', {})
+    # 呼び出し元のトランザクションの中なら、その中で書き込む（別スレッドからは見えないので）
+    if not config.get('ENABLED') or connection.in_atomic_block:
+        return func(*args)
+    if _write_queue is None:
+        _write_queue = WriteQueue(config.get('BATCH_SIZE', 64))
+    return _write_queue.submit(func, *args)
+
+
+def apply(user, amount, game, round_id=None):
+    """所持金にamountを加算して記録し、加算後の所持金を返す（round_idが精算済みなら加算しない）"""
+    if not amount:
+        return user.money
+    user.money = _submit(_apply, user.pk, amount, game, round_id)
+    return user.money
+
+
+def _apply(user_id, amount, game, round_id):
+    try:
+        with transaction.atomic():
+            CustomUser.objects.filter(pk=user_id).update(money=F('money') + amount)
+            balance = CustomUser.objects.filter(pk=user_id).values_list('money', flat=True).get()
+            WalletEntry.objects.create(user_id=user_id, game=game, amount=amount, balance=balance, round_id=round_id)
+    except IntegrityError:
+        if round_id is None or not WalletEntry.objects.filter(user_id=user_id, round_id=round_id).exists():
+            raise
+        # 精算済みのラウンド（加算は取り消された）
+        balance = CustomUser.objects.filter(pk=user_id).values_list('money', flat=True).get()
+    return balance
+
+
+def apply_many(deltas):
+    """(user_id, amount, game, round_id) のリストをまとめて精算し、ユーザーごとの所持金を返す
+
+    ユーザーごとに1回のUPDATEで合計を加算し、記録はbulk_createで追記する。
+    どれかのラウンドが精算済みなら全体を取り消す（同じ精算のやり直し）。
+    """
+    deltas = [delta for delta in deltas if delta[1]]
+    if not deltas:
+        return {}
+    return _submit(_apply_many, deltas)
+
+
+def _apply_many(deltas):
+    totals = defaultdict(int)
+    for user_id, amount, _, _ in deltas:
+        totals[user_id] += amount
+
+    try:
+        return _apply_totals(totals, deltas)
+    except IntegrityError:
+        if not any(
+            WalletEntry.objects.filter(user_id=user_id, round_id=round_id).exists()
+            for user_id, _, _, round_id in deltas if round_id is not None
+        ):
+            raise
+    # 精算済みのラウンド（加算は取り消された）
+    return dict(CustomUser.objects.filter(pk__in=totals).values_list('pk', 'money'))
+
+
+def _apply_totals(totals, deltas):
+    with transaction.atomic():
+        for user_id, total in totals.items():
+            if total:
+                CustomUser.objects.filter(pk=user_id).update(money=F('money') + total)
+        balances = dict(CustomUser.objects.filter(pk__in=totals).values_list('pk', 'money'))
+
+        # 加算後の所持金から、1件ずつの時点の所持金を逆算して記録
+        running = {user_id: balances[user_id] - total for user_id, total in totals.items()}
+        entries = []
+        for user_id, amount, game, round_id in deltas:
+            running[user_id] += amount
+            entries.append(WalletEntry(
+                user_id=user_id, game=game, amount=amount, balance=running[user_id], round_id=round_id))
+        WalletEntry.objects.bulk_create(entries)
+    return balances
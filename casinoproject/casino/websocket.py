@@ -0,0 +1,106 @@
+"""テーブルのWebSocket（素のASGIアプリケーション）
+
+/ws/table/<game>/<name>/ に接続すると、セッションのログインユーザーとしてテーブルに参加する。
+メッセージはすべてJSON（{"type": ...}）で、内容は casino.tables を参照。
+"""
+import json
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlparse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.utils.crypto import constant_time_compare
+from .tables import GAMES, Connection, hub
+
+PATH = re.compile(r'^/ws/table/(?P<game>[a-z]+)/(?P<name>[\w-]{1,32})/$')
+
+# 受け付けるメッセージの最大サイズ
+MAX_MESSAGE_SIZE = 4096
+
+# 接続を拒否するときのクローズコード
+CLOSE_NOT_FOUND = 4404
+CLOSE_FORBIDDEN = 4403
+CLOSE_UNAUTHORIZED = 4401
+
+
+def get_session_user(session_key):
+    """セッションキーからログイン中のユーザーを取得（ログインしていなければNone）"""
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore(session_key)
+    user_id = session.get(SESSION_KEY)
+    if user_id is None:
+        return None
+    User = get_user_model()
+    try:
+        user = User._default_manager.get(pk=User._meta.pk.to_python(user_id))
+    except User.DoesNotExist:
+        return None
+    # パスワード変更などで無効になったセッションは受け付けない
+    session_hash = session.get(HASH_SESSION_KEY)
+    if not user.is_active or not session_hash:
+        return None
+    if not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return None
+    return user
+
+
+def is_same_origin(headers):
+    """別のサイトのページからの接続でないか"""
+    origin = headers.get('origin')
+    if origin is None:
+        return True
+    return urlparse(origin).netloc == headers.get('host')
+
+
+async def websocket_application(scope, receive, send):
+    """テーブルのWebSocket接続を処理"""
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+
+    match = PATH.match(scope['path'])
+    if match is None or match['game'] not in GAMES:
+        await send({'type': 'websocket.close', 'code': CLOSE_NOT_FOUND})
+        return
+    headers = {
+        name.decode('latin1').lower(): value.decode('latin1')
+        for name, value in scope.get('headers', [])
+    }
+    if not is_same_origin(headers):
+        await send({'type': 'websocket.close', 'code': CLOSE_FORBIDDEN})
+        return
+    morsel = SimpleCookie(headers.get('cookie', '')).get(settings.SESSION_COOKIE_NAME)
+    user = await sync_to_async(get_session_user)(morsel.value) if morsel else None
+    if user is None:
+        await send({'type': 'websocket.close', 'code': CLOSE_UNAUTHORIZED})
+        return
+
+    await send({'type': 'websocket.accept'})
+    table = hub.get(match['game'], match['name'])
+    connection = Connection(user, send)
+    try:
+        await table.join(connection)
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] != 'websocket.receive':
+                continue
+            text = event.get('text')
+            if text is None:
+                text = (event.get('bytes') or b'').decode('utf-8', 'replace')
+            try:
+                if len(text) > MAX_MESSAGE_SIZE:
+                    raise ValueError
+                message = json.loads(text)
+                if not isinstance(message, dict):
+                    raise ValueError
+            except ValueError:
+                await connection.send({'type': 'error', 'error': 'invalid message'})
+                continue
+            await table.receive(connection, message)
+    finally:
+        await table.leave(connection)
+        hub.discard_empty(table)
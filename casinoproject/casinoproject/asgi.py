@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'casinoproject.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Djangoの初期化が終わってから読み込む
+from casino.websocket import websocket_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """WebSocketはテーブルへ、それ以外はDjangoへ振り分ける"""
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'casino.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -67,10 +69,41 @@ WSGI_APPLICATION = 'casinoproject.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('CASINO_DB_NAME', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# SQLiteの設定（既定は basic で上の素の設定のまま。本番は CASINO_DB_PROFILE=production）
+# production: WALで読み込みと書き込みを並行させ、ロック待ちはbusy timeoutで待つ。
+# 接続は使い回し、精算の書き込みは casino.wallet の1つのスレッドに順番に渡す。
+DB_PROFILE = os.environ.get('CASINO_DB_PROFILE', 'basic')
+
+if DB_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # ロックを待つ秒数（PRAGMA busy_timeout）
+            'timeout': 20,
+            # 書き込むトランザクションは最初に書き込みロックを取る（途中で昇格してロックで失敗しない）
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA cache_size=-20000;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA temp_store=MEMORY'
+            ),
+        },
+    })
+
+# 精算（WalletEntry）の書き込みを1つのスレッドにまとめる
+WALLET_WRITE_QUEUE = {
+    'ENABLED': DB_PROFILE == 'production',
+    # 1つのトランザクションにまとめる書き込みの最大数
+    'BATCH_SIZE': 64,
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -108,11 +141,25 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_DIRS = [BASE_DIR / 'casino' / 'static']
-
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# カード画像も静的ファイルとしてハッシュ付きの名前で配信する
+STATICFILES_DIRS = [BASE_DIR / 'casino' / 'static', ('card_images', MEDIA_ROOT / 'image')]
+
+# collectstatic でファイル名に内容のハッシュを付け、圧縮版（.gz / .br）も作る（casino.assets）
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'casino.assets.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# カード画像のスプライトの出力先（manage.py build_card_atlas）
+CARD_ATLAS_DIR = BASE_DIR / 'casino' / 'static' / 'casino' / 'cards'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -122,3 +169,46 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'top'
 LOGOUT_REDIRECT_URL = 'landing'
+
+# ブラックジャックのベーシックストラテジー表（manage.py build_bj_strategy で作成）
+BLACKJACK_STRATEGY_FILE = BASE_DIR / 'casino' / 'data' / 'bj_strategy.bin'
+
+# 進行中のラウンドと山札の保存先（アクションごとにDBのセッションを書き換えない）
+# 'local' はプロセス内のLRU（ワーカーごとに別々）。同じマシンでも複数ワーカーで動かす場合はRedis互換サーバーを使う:
+#     {'BACKEND': 'redis', 'LOCATION': 'redis://127.0.0.1:6379/0', 'TIMEOUT': 60 * 60 * 24}
+GAME_STATE_STORE = {
+    'BACKEND': 'local',
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 60 * 60 * 24,
+}
+
+# バカラの履歴（GameHistory）はまとめて書き込む
+# 書き込み前の行はSPOOL_DIRのスプールにも残し、プロセスが落ちても次の起動で書き戻す
+GAME_HISTORY_BUFFER = {
+    'SPOOL_DIR': BASE_DIR / 'var' / 'history_spool',
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': 5.0,
+    # スプールを1行ごとにfsyncする（OSが落ちても失わないが、1ハンドごとにディスクを待つ）
+    'FSYNC': False,
+}
+
+# 共有のバカラテーブル（席の数と、最初のベットから配るまでの秒数）
+BACCARAT_TABLE = {
+    'SEATS': 7,
+    'BETTING_SECONDS': 15.0,
+}
+
+# /metrics（Prometheus形式の処理時間）
+# 複数ワーカーで動かすときは MULTIPROCESS_DIR に共有のディレクトリを指定する（起動前に空にする）
+METRICS = {
+    'MULTIPROCESS_DIR': os.environ.get('CASINO_METRICS_DIR'),
+    'ALLOWED_IPS': ['127.0.0.1', '::1'],
+}
+
+# ゲーム画面の描画時間の予算（ミリ秒）。超えたら casino.rendering がDEBUGレベルでログに残す
+# （描画時間は Server-Timing ヘッダーと /metrics で常に見られる）
+RENDER_BUDGET_MS = {
+    'casino/blackjack.html': 20,
+    'casino/bacarrat.html': 20,
+    'casino/bacara_bet.html': 20,
+}
@@ -2,13 +2,18 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from casino import assets, views as casino_views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('accounts.urls')),
     path('casino/', include('casino.urls')),
+    path('metrics', casino_views.metrics, name='metrics'),
 ]
 
 # 開発環境でメディアファイルを配信
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+else:
+    # 本番はcollectstatic済みの静的ファイル（ハッシュ付きは1年キャッシュ）とメディアファイルを配信
+    urlpatterns += assets.urlpatterns()